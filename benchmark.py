@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+#
+# Solver for Hearthstone Barrens Mystery "Hunter Puzzle"
+# MIT License
+# Copyright (c) 2021 Laszlo Makk
+#
+# Benchmark runner: runs solver scripts as subprocesses (each multiple times, with a timeout),
+# and reports their success rate and time-to-solution.
+# A run is successful if the solver printed "DONE!".
+
+import argparse
+import concurrent.futures
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, NamedTuple, Sequence
+
+# name -> command line. "{seed}" is replaced by the index of the run.
+SOLVERS = {
+    "script2": ["script2.py"],
+    "script3": ["script3.py"],
+    "script4": ["script4.py"],
+    "script5-chaincraft-heuristic": ["script5.py", "--moves", "chaincraft", "--rollout", "heuristic", "--seed", "{seed}"],
+    "script5-chaincraft-random": ["script5.py", "--moves", "chaincraft", "--rollout", "random", "--seed", "{seed}"],
+    "script5-single-heuristic": ["script5.py", "--moves", "single", "--rollout", "heuristic", "--seed", "{seed}"],
+}  # type: Dict[str, Sequence[str]]
+
+
+class RunResult(NamedTuple):
+    solver: str
+    seed: int
+    solved: bool
+    wall_time: float
+    timed_out: bool
+
+
+def run_solver(solver: str, seed: int, timeout: float, extra_args: Sequence[str]) -> RunResult:
+    cmd = [sys.executable] + [arg.replace("{seed}", str(seed)) for arg in SOLVERS[solver]] + list(extra_args)
+    time_start = time.monotonic()
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout, text=True)
+    except subprocess.TimeoutExpired:
+        return RunResult(solver, seed, solved=False, wall_time=time.monotonic() - time_start, timed_out=True)
+    solved = "\nDONE!\n" in proc.stdout
+    return RunResult(solver, seed, solved=solved, wall_time=time.monotonic() - time_start, timed_out=False)
+
+
+def print_results_table(results: Sequence[RunResult]) -> None:
+    print(f"{'solver':<32} {'runs':>5} {'solved':>7} {'timeouts':>9} {'median tts':>11} {'mean tts':>9}")
+    for solver in dict.fromkeys(result.solver for result in results):
+        runs = [result for result in results if result.solver == solver]
+        solved_times = [result.wall_time for result in runs if result.solved]
+        median_tts = f"{statistics.median(solved_times):.1f}s" if solved_times else "-"
+        mean_tts = f"{statistics.mean(solved_times):.1f}s" if solved_times else "-"
+        print(f"{solver:<32} {len(runs):>5} {len(solved_times):>7} "
+              f"{sum(result.timed_out for result in runs):>9} {median_tts:>11} {mean_tts:>9}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare success rate and time-to-solution of solvers.")
+    parser.add_argument("--solvers", default="script2,script3,script5-chaincraft-heuristic",
+                        help=f"comma separated; available: {', '.join(SOLVERS)}")
+    parser.add_argument("--runs", type=int, default=1, help="runs per solver (seeds 0..runs-1)")
+    parser.add_argument("--timeout", type=float, default=3600, help="seconds per run")
+    parser.add_argument("--jobs", type=int, default=1, help="number of runs executing concurrently")
+    parser.add_argument("extra_args", nargs="*", help="passed to every solver (after --)")
+    args = parser.parse_args()
+
+    solvers = args.solvers.split(",")
+    for solver in solvers:
+        if solver not in SOLVERS:
+            parser.error(f"unknown solver: {solver}")
+    time_start = time.monotonic()
+    results = []  # type: List[RunResult]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(run_solver, solver, seed, args.timeout, args.extra_args)
+                   for solver in solvers for seed in range(args.runs)]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            print(f"{result.solver} (seed={result.seed}): solved={result.solved}. "
+                  f"{result.timed_out=}. time taken: {result.wall_time:.3f} seconds.")
+            results.append(result)
+    results.sort(key=lambda result: (solvers.index(result.solver), result.seed))
+    print(f"=====")
+    print_results_table(results)
+    print(f"Total time taken: {time.monotonic()-time_start:.3f} seconds.")
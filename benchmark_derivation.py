@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+#
+# Solver for Hearthstone Barrens Mystery "Hunter Puzzle"
+# MIT License
+# Copyright (c) 2021 Laszlo Makk
+#
+# Benchmark of the derivation of best crafting trades, chains and items needed (see hsutil.py),
+# on generated puzzles with many items.
+# Compares hsutil's shortest-path-tree derivation against the previous method: sweeping all
+# items x all trades until nothing changes, then walking the crafting chain of each item.
+# Generated counts are large random numbers, so that items have no ties for the best trade.
+
+import argparse
+import random
+import time
+from collections import defaultdict
+from typing import Dict, NamedTuple, Sequence, Tuple
+
+import hsutil
+
+
+class GeneratedTrade:
+    """Has the attributes of a Trade that the derivation uses. Items are ints; 0 is gold."""
+    __slots__ = ("WE_GET_ITEM", "WE_GET_COUNT", "THEY_GET_ITEM", "THEY_GET_COUNT")
+
+    def __init__(self, we_get_item: int, they_get_item: int, they_get_count: int):
+        self.WE_GET_ITEM = we_get_item
+        self.WE_GET_COUNT = 1
+        self.THEY_GET_ITEM = they_get_item
+        self.THEY_GET_COUNT = they_get_count
+
+    def __repr__(self):
+        return f"<{self.THEY_GET_COUNT}x{self.THEY_GET_ITEM} -> {self.WE_GET_ITEM}>"
+
+
+class GeneratedPuzzle(NamedTuple):
+    num_items: int
+    trades: Sequence[GeneratedTrade]
+    demands: Sequence[Tuple[int, int]]  # as the bottom-line trades: (item, count)
+
+
+def generate_puzzle(num_items: int, *, trades_per_item: int, num_demands: int, seed: int) -> GeneratedPuzzle:
+    rng = random.Random(seed)
+    trades = []
+    for item in range(1, num_items):
+        # one trade from an earlier item, so that every item can be crafted; the others from any item
+        trades.append(GeneratedTrade(item, rng.randrange(item), rng.randint(2, 1_000_000)))
+        for _ in range(trades_per_item - 1):
+            trades.append(GeneratedTrade(item, rng.randrange(num_items), rng.randint(2, 1_000_000)))
+    rng.shuffle(trades)
+    demands = [(rng.randrange(1, num_items), rng.randint(1, 10)) for _ in range(num_demands)]
+    return GeneratedPuzzle(num_items, trades, demands)
+
+
+def derive_new(puzzle: GeneratedPuzzle):
+    goldvalues, besttrades, settled_order = hsutil.derive_best_crafting_trades(puzzle.trades, base_item=0)
+    tradechains, itemchains = hsutil.derive_crafting_chains(besttrades, settled_order)
+    items_needed = hsutil.derive_items_needed(puzzle.demands, besttrades, settled_order)
+    return goldvalues, besttrades, tradechains, itemchains, items_needed
+
+
+def derive_old(puzzle: GeneratedPuzzle):
+    """The previous derivation of hsutil.py, on a generated puzzle."""
+    goldvalues = {0: 1}  # type: Dict[int, int]
+    besttrades = {}  # type: Dict[int, GeneratedTrade]
+    while True:
+        updated_anything = False
+        for item in range(puzzle.num_items):
+            for trade in puzzle.trades:
+                if trade.WE_GET_ITEM != item:
+                    continue
+                price = goldvalues.get(trade.THEY_GET_ITEM, None)
+                if price is None:
+                    continue
+                price *= trade.THEY_GET_COUNT
+                old_besttrade = besttrades.get(item)
+                old_goldval = goldvalues.get(item, float("inf"))
+                if price < old_goldval:
+                    goldvalues[item] = price
+                    besttrades[item] = trade
+                    updated_anything = True
+                elif price == old_goldval and trade != old_besttrade:
+                    assert False, "found multiple optimal paths to craft item!"
+        if not updated_anything:
+            break
+
+    items_needed = defaultdict(int)  # type: Dict[int, int]
+    crafting_queue = [(item, count) for item, count in puzzle.demands]
+    while crafting_queue:
+        to_craft_item, to_craft_count = crafting_queue.pop()
+        items_needed[to_craft_item] += to_craft_count
+        if to_craft_item == 0:
+            continue
+        trade = besttrades[to_craft_item]
+        crafting_queue.append((trade.THEY_GET_ITEM, trade.THEY_GET_COUNT * to_craft_count))
+
+    tradechains = {}  # type: Dict[int, Tuple[Tuple[GeneratedTrade, int], ...]]
+    itemchains = {}  # type: Dict[int, Tuple[Tuple[int, int], ...]]
+    for item in range(puzzle.num_items):
+        tradechain, itemchain = [], []
+        ingredient = item
+        multiplier = 1
+        while ingredient != 0:
+            itemchain.append((ingredient, multiplier))
+            tradechain.append((besttrades[ingredient], multiplier))
+            multiplier *= besttrades[ingredient].THEY_GET_COUNT
+            ingredient = besttrades[ingredient].THEY_GET_ITEM
+        itemchain.append((ingredient, multiplier))
+        tradechains[item] = tuple(tradechain)
+        itemchains[item] = tuple(itemchain)
+    return goldvalues, besttrades, tradechains, itemchains, items_needed
+
+
+def check_same_results(new_results, old_results) -> None:
+    goldvalues, besttrades, tradechains, itemchains, items_needed = new_results
+    old_goldvalues, old_besttrades, old_tradechains, old_itemchains, old_items_needed = old_results
+    assert goldvalues == old_goldvalues
+    assert {item: trade for item, trade in besttrades.items() if trade is not None} == old_besttrades
+    assert tradechains == old_tradechains
+    assert itemchains == old_itemchains
+    assert {item: count for item, count in items_needed.items() if count} == dict(old_items_needed)
+
+
+def time_call(func, *args, repeat: int) -> Tuple[float, object]:
+    """Returns (min time over repeats, result)."""
+    best_time = float("inf")
+    for _ in range(repeat):
+        time_start = time.monotonic()
+        result = func(*args)
+        best_time = min(best_time, time.monotonic() - time_start)
+    return best_time, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the derivation of crafting trades on generated puzzles.")
+    parser.add_argument("--items", type=int, nargs="+", default=[30, 100, 300, 1000, 3000, 10000, 30000],
+                        help="numbers of items of the generated puzzles")
+    parser.add_argument("--trades-per-item", type=int, default=3)
+    parser.add_argument("--demands", type=int, default=40, help="number of bottom-line trades")
+    parser.add_argument("--max-old-items", type=int, default=1000,
+                        help="only run the previous method on puzzles with at most this many items")
+    parser.add_argument("--repeat", type=int, default=3, help="report the min time of this many runs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"=====")
+    print(f"{'items':>7} {'trades':>7} {'chain len':>9} {'new':>10} {'old':>10} {'speedup':>8}")
+    for num_items in args.items:
+        puzzle = generate_puzzle(num_items, trades_per_item=args.trades_per_item, num_demands=args.demands,
+                                 seed=args.seed)
+        time_new, new_results = time_call(derive_new, puzzle, repeat=args.repeat)
+        max_chain_len = max(len(chain) for chain in new_results[2].values())
+        if num_items <= args.max_old_items:
+            time_old, old_results = time_call(derive_old, puzzle, repeat=args.repeat)
+            check_same_results(new_results, old_results)
+            old_str, speedup_str = f"{time_old * 1000:.1f}ms", f"{time_old / time_new:.1f}x"
+        else:
+            old_str, speedup_str = "-", "-"
+        print(f"{num_items:>7} {len(puzzle.trades):>7} {max_chain_len:>9} {time_new * 1000:>8.1f}ms "
+              f"{old_str:>10} {speedup_str:>8}")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+#
+# Solver for Hearthstone Barrens Mystery "Hunter Puzzle"
+# MIT License
+# Copyright (c) 2021 Laszlo Makk
+#
+# Pluggable pruning bounds, on top of GameState.sanity_check_current_state.
+# Each bound is a necessary condition for a state to be part of a solution, but only under the
+# assumptions of the search it is attached to (which observations hold, and whether the edges are
+# chaincrafts or single trades), so the bounds get told the latter (atomic_chaincraft).
+# Cutting the DFS when one fails excludes no solution, as long as the argument of the bound is right;
+# the arguments are not machine-checked (a wrong one silently loses solutions).
+# Bounds are attached to a GameState via GameState.extra_bounds, and keep statistics
+# of how many states they pruned, and how long they took.
+
+import argparse
+import time
+from typing import Dict, List, Sequence, Tuple, Type
+
+import hsutil
+from hsutil import BOTTOM_LINE_TRADES
+from hsutil import GameState
+from hsutil import ITEMBITMAPS_USABLE_FOR_BLTRADES_ANY
+from hsutil import ITEMBITMAPS_USED_FOR_BLTRADES
+from hsutil import Item
+
+
+class Bound:
+    NAME = None  # type: str
+    # whether the bound is only valid if crafts for different bottom-line trades are not interleaved (observation 7)
+    REQUIRES_ATOMIC_CHAINCRAFT = False
+
+    def __init__(self, *, atomic_chaincraft: bool):
+        self.atomic_chaincraft = atomic_chaincraft
+        self.num_calls = 0
+        self.num_pruned = 0
+        self.time_spent = 0.0
+
+    def is_sane(self, gs: GameState) -> bool:
+        time_start = time.perf_counter()
+        is_sane = self.check(gs)
+        self.time_spent += time.perf_counter() - time_start
+        self.num_calls += 1
+        if not is_sane:
+            self.num_pruned += 1
+        return is_sane
+
+    def check(self, gs: GameState) -> bool:
+        raise NotImplementedError()
+
+
+class CapitalScheduleBound(Bound):
+    """Observation 6 only checks that the max inventory-value we can still achieve covers
+    the max capital requirement of the remaining bottom-line trades. Here we check whether
+    the remaining bottom-line trades can be ordered so that each of them is funded.
+    Relaxation: the inventory-value only changes by the balance delta of bottom-line trades
+    (top-line trades can only decrease it).
+    The best order for this relaxation is known: first the positive balance delta trades in increasing
+    order of capital requirement, then the rest in decreasing order of value they leave behind
+    (capital requirement + balance delta). If even that fails, no order works.
+    """
+    NAME = "capital_schedule"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        trades = [(1 << idx, trade.outvalue(), trade.delta_balance()) for idx, trade in enumerate(BOTTOM_LINE_TRADES)]
+        positive = sorted((x for x in trades if x[2] > 0), key=lambda x: x[1])
+        nonpositive = sorted((x for x in trades if x[2] <= 0), key=lambda x: -(x[1] + x[2]))
+        self._schedule = tuple(positive + nonpositive)  # type: Sequence[Tuple[int, int, int]]
+
+    def check(self, gs: GameState) -> bool:
+        value = gs.cur_inventory_goldvalue
+        done = gs.bottomlinetrades_done
+        for bit, capital_req, delta in self._schedule:
+            if done & bit:
+                continue
+            if value < capital_req:
+                return False
+            value += delta
+        return True
+
+
+class ChaincraftSlotsBound(Bound):
+    """With atomic chaincrafts (observation 7), we are crafting for (or about to craft for) one of
+    the remaining bottom-line trades. Items in the inventory that crafting for that trade cannot use
+    are not touched, so right before the bottom-line trade we hold all of them, plus the item the trade needs.
+    If that is more than 10 item types for all remaining trades, no solution can be reached.
+    """
+    NAME = "chaincraft_slots"
+    REQUIRES_ATOMIC_CHAINCRAFT = True
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # note: any craft-sequence (not just the optimal one) might use GOLD
+        self._usable_itembitmaps = tuple(itembitmap | (1 << Item.GOLD)
+                                         for itembitmap in ITEMBITMAPS_USED_FOR_BLTRADES)  # type: Sequence[int]
+
+    def check(self, gs: GameState) -> bool:
+        if gs.is_complete():
+            return True
+        held = 0
+        for item, count in gs.cur_inventory.items():
+            if count > 0:
+                held |= 1 << item
+        done = gs.bottomlinetrades_done
+        for idx, usable_itembitmap in enumerate(self._usable_itembitmaps):
+            if done & (1 << idx):
+                continue
+            if 1 + bin(held & ~usable_itembitmap).count("1") <= 10:
+                return True
+        return False
+
+
+class DeadItemsBound(Bound):
+    """Items that none of the remaining bottom-line trades can use ("dead items") can only ever
+    end up in the final inventory. So their value must fit into the final inventory:
+    with observation 5 it must be zero, otherwise at most STARTING_GOLD minus the value lost so far.
+    Single trades (without observation 7) with bad trades allowed (without observation 4) can use
+    a bad trade for part of a craft-sequence, so more items are useful then
+    (see ITEMBITMAPS_USABLE_FOR_BLTRADES_ANY).
+    """
+    NAME = "dead_items"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # bottomlinetrades_done -> bitmap of items still useful (see ITEMBITMAPS_USED_FOR_BLTRADES)
+        self._useful_itembitmaps = {}  # type: Dict[int, int]
+
+    def check(self, gs: GameState) -> bool:
+        if gs.allow_leftover_items:
+            max_dead_value = hsutil.STARTING_GOLD - gs.value_lost
+        else:
+            max_dead_value = 0
+        done = gs.bottomlinetrades_done
+        useful_items = self._useful_itembitmaps.get(done)
+        if useful_items is None:
+            useful_items = 1 << Item.GOLD
+            if gs.allow_bad_trades and not self.atomic_chaincraft:
+                itembitmaps = ITEMBITMAPS_USABLE_FOR_BLTRADES_ANY
+            else:
+                itembitmaps = ITEMBITMAPS_USED_FOR_BLTRADES
+            for idx, itembitmap in enumerate(itembitmaps):
+                if not (done & (1 << idx)):
+                    useful_items |= itembitmap
+            if len(self._useful_itembitmaps) >= 1_000_000:
+                self._useful_itembitmaps.clear()
+            self._useful_itembitmaps[done] = useful_items
+        dead_value = 0
+        for item, count in gs.cur_inventory.items():
+            if count > 0 and not (useful_items & (1 << item)):
+                dead_value += count * item.goldvalue()
+        return dead_value <= max_dead_value
+
+
+ALL_BOUNDS = {cls.NAME: cls for cls in (CapitalScheduleBound, ChaincraftSlotsBound, DeadItemsBound)}  # type: Dict[str, Type[Bound]]
+
+
+def create_bounds(names: str, *, atomic_chaincraft: bool) -> List[Bound]:
+    """names is a comma separated list of bound names (or "all", or "")."""
+    if names == "all":
+        names_list = [name for name, cls in ALL_BOUNDS.items()
+                      if atomic_chaincraft or not cls.REQUIRES_ATOMIC_CHAINCRAFT]
+    else:
+        names_list = [name for name in names.split(",") if name]
+    bounds = []
+    for name in names_list:
+        if name not in ALL_BOUNDS:
+            raise ValueError(f"unknown bound: {name!r}. available: {', '.join(ALL_BOUNDS)}")
+        cls = ALL_BOUNDS[name]
+        if cls.REQUIRES_ATOMIC_CHAINCRAFT and not atomic_chaincraft:
+            raise ValueError(f"bound {name!r} is only valid for atomic chaincrafts (observation 7)")
+        bounds.append(cls(atomic_chaincraft=atomic_chaincraft))
+    return bounds
+
+
+def add_bounds_args(parser: argparse.ArgumentParser, *, default: str = "") -> None:
+    parser.add_argument("--bounds", default=default,
+                        help=f"comma separated list of extra bounds to prune with, or 'all'. "
+                             f"available: {', '.join(ALL_BOUNDS)}. note: 'all' can cost more than it prunes; "
+                             f"in script3.py only capital_schedule prunes anything (use that there)")
+
+
+def attach_bounds(gs: GameState, names: str, *, atomic_chaincraft: bool) -> List[Bound]:
+    bounds = create_bounds(names, atomic_chaincraft=atomic_chaincraft)
+    gs.extra_bounds = bounds
+    return bounds
+
+
+def print_bounds_report(bounds: Sequence[Bound]) -> None:
+    for bound in bounds:
+        cost_per_call = bound.time_spent / bound.num_calls * 1e6 if bound.num_calls else 0
+        print(f"- bound {bound.NAME}: calls={bound.num_calls}. pruned={bound.num_pruned}. "
+              f"cost per call: {cost_per_call:.2f} us")
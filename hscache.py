@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+#
+# Solver for Hearthstone Barrens Mystery "Hunter Puzzle"
+# MIT License
+# Copyright (c) 2021 Laszlo Makk
+#
+# Persistent (on-disk) cache of search results, so that repeated, interrupted and
+# concurrent runs can reuse the work of each other.
+# - refuted states: state keys (see GameState.get_state_key) that a DFS fully explored without
+#   finding a solution. Stored as fixed-size records appended to a binary file, after a header.
+# - solved: solutions (trade indices, as in GameState.dump_history_trade_idx_ints), one per line.
+# The files of a cache are named after a fingerprint of the puzzle definition (all trades)
+# and of the search assumptions (including the active hsbounds bounds, which prune states too),
+# as refuted states are only valid under the same assumptions.
+# Files are append-only. Records are appended in batches, each batch with a single write
+# under an exclusive lock, so processes sharing a cache do not interleave records.
+# A torn last record (the process was killed mid-write) is cut off by the next writer.
+
+import fcntl
+import hashlib
+import os
+from typing import List, Optional, Sequence
+
+import hsutil
+from hsutil import ALL_TRADES_ANY
+from hsutil import GameState
+from hsutil import RefutedStatesCache
+
+HEADER_SIZE = 64
+
+
+def get_puzzle_fingerprint(**assumptions) -> str:
+    """Hash of every trade definition and of the given search assumptions."""
+    h = hashlib.sha256()
+    for trade in ALL_TRADES_ANY:
+        h.update(repr((trade.__name__, trade.IS_BOTTOM_LINE, trade.WE_GET_ITEM.name, trade.WE_GET_COUNT,
+                       trade.THEY_GET_ITEM.name, trade.THEY_GET_COUNT)).encode())
+    h.update(repr((hsutil.STARTING_GOLD, sorted(assumptions.items()))).encode())
+    return h.hexdigest()[:16]
+
+
+class PersistentRefutedStatesCache(RefutedStatesCache):
+    """RefutedStatesCache that is loaded from, and appended to, a file.
+    New keys are buffered, and written every `flush_every` keys (and on close).
+    refresh() loads the keys that other processes appended since.
+    """
+
+    def __init__(self, path: str, *, fingerprint: str, key_size: int, max_size: int = 5_000_000,
+                 flush_every: int = 10_000):
+        super().__init__(max_size=max_size)
+        self.path = path
+        self.key_size = key_size
+        self.flush_every = flush_every
+        self.num_loaded = 0
+        self.num_written = 0
+        self._pending = []  # type: List[bytes]
+        header = f"hs-refuted-states {fingerprint} {key_size}\n".encode().ljust(HEADER_SIZE, b" ")
+        self._fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        with self._locked():
+            if os.fstat(self._fd).st_size < HEADER_SIZE:
+                os.ftruncate(self._fd, 0)
+                os.write(self._fd, header)
+        if os.pread(self._fd, HEADER_SIZE, 0) != header:
+            raise Exception(f"unexpected header in {path}")
+        self._read_offset = HEADER_SIZE
+        self.refresh()
+
+    def _locked(self):
+        return _FileLock(self._fd)
+
+    def refresh(self) -> None:
+        """Loads the records appended (by any process) since the last load."""
+        file_size = os.fstat(self._fd).st_size
+        num_records = (file_size - self._read_offset) // self.key_size
+        if num_records <= 0:
+            return
+        data = os.pread(self._fd, num_records * self.key_size, self._read_offset)
+        self._read_offset += len(data)
+        for i in range(0, len(data), self.key_size):
+            super().add(data[i:i + self.key_size])
+        self.num_loaded += num_records
+
+    def add(self, key: bytes) -> None:
+        assert len(key) == self.key_size, (len(key), self.key_size)
+        super().add(key)
+        self._pending.append(key)
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        data = b"".join(self._pending)
+        with self._locked():
+            file_size = os.fstat(self._fd).st_size
+            torn_size = (file_size - HEADER_SIZE) % self.key_size
+            if torn_size:
+                os.ftruncate(self._fd, file_size - torn_size)
+            if file_size - torn_size == self._read_offset:
+                self._read_offset += len(data)  # nothing new from others; no need to read back our own
+            os.write(self._fd, data)
+        self.num_written += len(self._pending)
+        self._pending = []
+
+    def close(self) -> None:
+        self.flush()
+        os.close(self._fd)
+
+    def print_diagnostic_data(self) -> None:
+        super().print_diagnostic_data()
+        print(f"- persistent cache: {self.path}. records loaded: {self.num_loaded}. "
+              f"records written: {self.num_written}")
+
+
+class _FileLock:
+
+    def __init__(self, fd: int):
+        self.fd = fd
+
+    def __enter__(self):
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+
+class PersistentCache:
+    """All the files belonging to one puzzle fingerprint, inside cache_dir."""
+
+    def __init__(self, cache_dir: str, fingerprint: str):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.fingerprint = fingerprint
+        self.refuted_path = os.path.join(cache_dir, f"{fingerprint}.refuted")
+        self.solved_path = os.path.join(cache_dir, f"{fingerprint}.solved")
+
+    def open_refuted_states(self, gs: GameState, max_size: int) -> PersistentRefutedStatesCache:
+        return PersistentRefutedStatesCache(self.refuted_path, fingerprint=self.fingerprint,
+                                            key_size=len(gs.get_state_key()), max_size=max_size)
+
+    def load_solution(self) -> Optional[Sequence[int]]:
+        """Returns the last stored solution (trade indices), if any."""
+        if not os.path.exists(self.solved_path):
+            return None
+        with open(self.solved_path) as f:
+            lines = [line for line in f.read().splitlines() if line.strip()]
+        if not lines:
+            return None
+        return [int(x) for x in lines[-1].split(",")]
+
+    def store_solution(self, gs: GameState) -> None:
+        line = ",".join(str(idx) for idx in gs.dump_history_trade_idx_ints()) + "\n"
+        with open(self.solved_path, "a") as f:
+            f.write(line)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+#
+# Solver for Hearthstone Barrens Mystery "Hunter Puzzle"
+# MIT License
+# Copyright (c) 2021 Laszlo Makk
+#
+# Profiling support for the solver scripts (--profile).
+# - cprofile: deterministic profiling via cProfile. Exact call counts, but the overhead
+#   is large for the many small GameState methods, so it distorts their relative cost.
+# - sampling: a background thread periodically samples the stack of the main thread
+#   (sys._current_frames), so the search itself runs at (nearly) full speed.
+#   Samples are written in "collapsed stack" format (one "frame;frame;frame count" per line),
+#   which is the input of flamegraph.pl, speedscope, etc.
+# Both modes print a short summary of the hot GameState methods at the end.
+# Only the main process is profiled (not the worker processes of --jobs).
+
+import argparse
+import cProfile
+import collections
+import os
+import pstats
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+# hot paths of the search. summary lines are printed for these
+HOT_FUNCTIONS = (
+    "do_trade",
+    "undo_last_trade",
+    "chaincraft_bltrade",
+    "sanity_check_current_state",
+    "_recalc_max_rem_outval_trade",
+)
+
+
+def add_profile_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--profile", choices=("cprofile", "sampling"), default=None,
+                        help="profile the search")
+    parser.add_argument("--profile-output", default=None,
+                        help="file to write the profile to "
+                             "(cprofile: pstats dump; sampling: collapsed stacks). default: <script>.<mode>")
+    parser.add_argument("--profile-interval", type=float, default=0.001,
+                        help="sampling mode: seconds between samples "
+                             "(in effect at least sys.getswitchinterval(), as the sampler needs the GIL)")
+
+
+def _frame_name(frame) -> str:
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+
+
+class SamplingProfiler:
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stack_counts = collections.Counter()  # type: Dict[str, int]
+        self.num_samples = 0
+        self.time_start = self.time_stop = 0.0
+        self._main_thread_id = threading.main_thread().ident
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+
+    def start(self) -> None:
+        self.time_start = time.monotonic()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._thread.join()
+        self.time_stop = time.monotonic()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self._main_thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            self.stack_counts[";".join(reversed(stack))] += 1
+            self.num_samples += 1
+
+    def write_collapsed_stacks(self, path: str) -> None:
+        with open(path, "w") as f:
+            for stack, count in self.stack_counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def print_summary(self) -> None:
+        if not self.num_samples:
+            print(f"- samples: 0")
+            return
+        effective_interval = (self.time_stop - self.time_start) / self.num_samples
+        print(f"- samples: {self.num_samples} (every {effective_interval * 1000:.1f} ms, "
+              f"{self.interval * 1000:.1f} ms requested)")
+        for func_name in HOT_FUNCTIONS:
+            num_self = num_total = 0
+            for stack, count in self.stack_counts.items():
+                frames = [frame.split(":", 1)[1] for frame in stack.split(";")]
+                if func_name in frames:
+                    num_total += count
+                if frames[-1] == func_name:
+                    num_self += count
+            print(f"- {func_name}: self {100 * num_self / self.num_samples:.1f}%. "
+                  f"total {100 * num_total / self.num_samples:.1f}%")
+
+
+class Profiler:
+    """Wraps the profiler selected by the --profile options. start()/stop() around the search."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.mode = args.profile  # type: Optional[str]
+        script_name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        self.output = args.profile_output or f"{script_name}.{self.mode}"
+        self._cprofile = None  # type: Optional[cProfile.Profile]
+        self._sampling = None  # type: Optional[SamplingProfiler]
+        if self.mode == "cprofile":
+            self._cprofile = cProfile.Profile()
+        elif self.mode == "sampling":
+            self._sampling = SamplingProfiler(args.profile_interval)
+
+    def start(self) -> None:
+        if self._cprofile is not None:
+            self._cprofile.enable()
+        if self._sampling is not None:
+            self._sampling.start()
+
+    def stop(self) -> None:
+        """Stops profiling, writes the output file and prints a summary."""
+        if self.mode is None:
+            return
+        print(f"=====")
+        print(f"profile ({self.mode}) written to {self.output}")
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.output)
+            stats = pstats.Stats(self._cprofile)
+            for func_name in HOT_FUNCTIONS:
+                ncalls, tottime, cumtime = 0, 0.0, 0.0
+                for (filename, lineno, name), (_, ncalls_, tottime_, cumtime_, _) in stats.stats.items():
+                    if name == func_name:
+                        ncalls, tottime, cumtime = ncalls + ncalls_, tottime + tottime_, cumtime + cumtime_
+                print(f"- {func_name}: calls={ncalls}. "
+                      f"self {tottime:.3f} s. total {cumtime:.3f} s. "
+                      f"per call {1e6 * tottime / max(ncalls, 1):.2f} us")
+        if self._sampling is not None:
+            self._sampling.stop()
+            self._sampling.write_collapsed_stacks(self.output)
+            self._sampling.print_summary()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+#
+# Solver for Hearthstone Barrens Mystery "Hunter Puzzle"
+# MIT License
+# Copyright (c) 2021 Laszlo Makk
+#
+# Live progress reporting for long-running solvers.
+# A solver publishes a snapshot of its progress (a flat dict) every so many iterations
+# (10k for the DFS solvers); a background thread serves the latest snapshot as JSON, either
+# - over HTTP on localhost (--progress-port), or
+# - over a Unix domain socket (--progress-socket): connect, read JSON until EOF.
+#   If the given path is a directory, each process (e.g. each worker of sweep2.py)
+#   creates its own socket in it, named <script>.<pid>.sock.
+# The final snapshot (status "solved", "budget exhausted", ...) stays available: over HTTP until the
+# process exits, and for a Unix socket it is written next to it (<script>.<pid>.json, see
+# get_final_snapshot_path), as the socket is removed when the solver finishes.
+# Serving never touches the GameState, so the search loop only pays for building the snapshot.
+# See progress_monitor.py for polling (and aggregating) several solvers.
+
+import argparse
+import http.server
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from hsutil import GameState
+from hsutil import SearchBudget
+
+
+def add_progress_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--progress-port", type=int, default=None,
+                        help="serve live progress as JSON over HTTP on 127.0.0.1:PORT")
+    parser.add_argument("--progress-socket", default=None,
+                        help="serve live progress as JSON on this Unix domain socket path "
+                             "(if a directory: on <dir>/<script>.<pid>.sock)")
+
+
+class ProgressReporter:
+    """Holds the latest progress snapshot of a solver, and serves it (if an endpoint was given).
+    Processes of the same parallel run share a `group` (by default: the pid of the process).
+    """
+
+    def __init__(self, *, port: Optional[int] = None, socket_path: Optional[str] = None,
+                 group: Optional[int] = None, **fields):
+        self._lock = threading.Lock()
+        self._time_start = time.monotonic()
+        self._last_nodes = 0
+        self._last_time = self._time_start
+        script_name = os.path.basename(sys.argv[0])
+        self._snapshot = {
+            "script": script_name,
+            "args": sys.argv[1:],
+            "pid": os.getpid(),
+            "group": group if group is not None else os.getpid(),
+            "status": "running",
+            "elapsed": 0.0,
+        }  # type: Dict[str, Any]
+        self._snapshot.update(fields)
+        self._servers = []  # type: List[socketserver.BaseServer]
+        self._unix_server = None  # type: Optional[socketserver.BaseServer]
+        if port is not None:
+            self._servers.append(http.server.ThreadingHTTPServer(("127.0.0.1", port), self._make_http_handler()))
+        if socket_path is not None:
+            if os.path.isdir(socket_path):
+                socket_path = os.path.join(socket_path, f"{os.path.splitext(script_name)[0]}.{os.getpid()}.sock")
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            self._unix_server = socketserver.ThreadingUnixStreamServer(socket_path, self._make_unix_handler())
+            self._servers.append(self._unix_server)
+        self.socket_path = socket_path
+        for server in self._servers:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="ProgressServer", daemon=True).start()
+
+    def update(self, **fields) -> None:
+        with self._lock:
+            self._snapshot.update(fields)
+
+    def update_from_search(self, gs: GameState, budget: SearchBudget, **fields) -> None:
+        """Snapshot of a search driven by a SearchBudget (i.e. the DFS and greedy solvers)."""
+        now = time.monotonic()
+        nodes_per_sec = (budget.num_nodes - self._last_nodes) / max(now - self._last_time, 1e-9)
+        self._last_nodes, self._last_time = budget.num_nodes, now
+        num_bottomtradesdone, goldvalue = gs.get_progress_score()
+        if budget.is_bounded:  # otherwise the budget does not track the best partial state
+            self.update(best_score=budget.best_score, best_history=budget.best_history.trade_idxs.tolist())
+        self.update(nodes=budget.num_nodes,
+                    nodes_per_sec=round(nodes_per_sec),
+                    depth=len(gs.history),
+                    bottom_trades_done=num_bottomtradesdone,
+                    inventory_goldvalue=goldvalue,
+                    inventory={item.name: count for item, count in gs.cur_inventory.items() if count},
+                    bounds_pruned={bound.NAME: bound.num_pruned for bound in gs.extra_bounds},
+                    **fields)
+
+    def finish_search(self, gs: GameState, budget: SearchBudget, **fields) -> None:
+        if gs.is_complete():
+            status = "solved"
+        elif budget.is_exhausted:
+            status = "budget exhausted"
+        else:
+            status = "no solution"
+        self.update_from_search(gs, budget, **fields)
+        self.close(status)
+
+    def get_snapshot_json(self) -> bytes:
+        with self._lock:
+            self._snapshot["elapsed"] = round(time.monotonic() - self._time_start, 3)
+            return json.dumps(self._snapshot).encode()
+
+    def close(self, status: str) -> None:
+        """Sets the final status. The HTTP server keeps serving the final snapshot until the process exits;
+        the Unix socket is removed, and the final snapshot written to get_final_snapshot_path instead.
+        """
+        self.update(status=status)
+        if self._unix_server is None:
+            return
+        final_path = get_final_snapshot_path(self.socket_path)
+        with open(final_path + ".tmp", "wb") as f:
+            f.write(self.get_snapshot_json())
+        os.replace(final_path + ".tmp", final_path)  # so that readers never see a partial file
+        self._unix_server.shutdown()
+        self._unix_server.server_close()
+        self._servers.remove(self._unix_server)
+        self._unix_server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def _make_http_handler(self):
+        reporter = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = reporter.get_snapshot_json()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # keep the solver output clean
+
+        return Handler
+
+    def _make_unix_handler(self):
+        reporter = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                self.request.sendall(reporter.get_snapshot_json())
+
+        return Handler
+
+
+def get_final_snapshot_path(socket_path: str) -> str:
+    """Where the final snapshot of the solver serving on socket_path is written (see progress_monitor.py)."""
+    return os.path.splitext(socket_path)[0] + ".json"
+
+
+def create_progress_reporter(args: argparse.Namespace, **fields) -> ProgressReporter:
+    return ProgressReporter(port=args.progress_port, socket_path=args.progress_socket, **fields)
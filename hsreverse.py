@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+#
+# Solver for Hearthstone Barrens Mystery "Hunter Puzzle"
+# MIT License
+# Copyright (c) 2021 Laszlo Makk
+#
+# Reverse-transition model: the predecessors of a game state, under a single trade or
+# under a chaincraft (see GameState.chaincraft_bltrade), for searching backwards from the goal.
+# (10xGOLD, all bottom-line trades done.) Observations 1-7 are assumed, as in script3.py.
+# A state here is (bottomlinetrades_done, inventory), the inventory being a tuple of counts in Item order.
+# Reversing a trade executed with multiplier m:
+# - max-buy: the trade uses up as many of THEY_GET_ITEM as possible, so after a (top-line) trade
+#   fewer than THEY_GET_COUNT are left; and m can be anything from 1 to (WE_GET_ITEM count) / WE_GET_COUNT.
+# - the state after every executed trade passes the checks of GameState.sanity_check_current_state
+#   (capital requirements, at most 10 item-types), and no item is crafted more than its cap.
+# - in a chaincraft, any of the top-line trades might have not executed.
+# These are necessary conditions, so the model is an over-approximation: every real predecessor is
+# generated, but not every generated state is reachable from the start. So the backward search can
+# only rule states out; a solution is always confirmed by the forward search (see script7.py).
+
+import array
+import time
+from typing import Dict, Iterator, Set, Tuple, Type
+
+import hsutil
+from hsutil import BOTTOM_LINE_TRADES
+from hsutil import BOTTOM_LINE_TRADES_DONE_BITMAP
+from hsutil import BottomLineTrade
+from hsutil import CRAFTING_TRADECHAIN_FOR_TRADE
+from hsutil import INVERSEMAP_BOTTOMLINETRADES
+from hsutil import Item
+from hsutil import STARTING_GOLD
+from hsutil import Trade
+
+ITEMS = tuple(Item)
+ITEM_POS = {item: pos for pos, item in enumerate(ITEMS)}  # type: Dict[Item, int]
+ITEM_GOLDVALUES = tuple(item.goldvalue() for item in ITEMS)
+
+Inventory = Tuple[int, ...]
+GOAL_INVENTORY = tuple(STARTING_GOLD if item == Item.GOLD else 0 for item in ITEMS)  # type: Inventory
+
+
+def get_state_key(bltrades_done: int, inventory: Inventory) -> bytes:
+    """Same as GameState.get_state_key (without bad trades)."""
+    return bltrades_done.to_bytes(5, "little") + array.array("H", inventory).tobytes()
+
+
+class ReverseModel:
+    """Generates the predecessors of states. `crafted` is the number of each item crafted
+    after the state (in the part of the path already reversed), for the items_crafted caps.
+    """
+
+    def __init__(self):
+        items_crafted_cap = hsutil.get_items_crafted_cap()
+        self.items_crafted_cap = tuple(items_crafted_cap[item] for item in ITEMS)
+        # bottomlinetrades_done -> (sum_of_rem_balancepositive_trades, max_rem_outval_trade)
+        self._remaining_trades_memo = {}  # type: Dict[int, Tuple[int, int]]
+
+    def _get_remaining_trades_stats(self, bltrades_done: int) -> Tuple[int, int]:
+        stats = self._remaining_trades_memo.get(bltrades_done)
+        if stats is None:
+            remaining = [trade for trade in BOTTOM_LINE_TRADES
+                         if not bltrades_done & (1 << INVERSEMAP_BOTTOMLINETRADES[trade])]
+            stats = (sum(trade.delta_balance() for trade in remaining if trade.delta_balance() > 0),
+                     max((trade.outvalue() for trade in remaining), default=-1))
+            self._remaining_trades_memo[bltrades_done] = stats
+        return stats
+
+    def is_sane(self, bltrades_done: int, inventory: Inventory) -> bool:
+        """The checks of GameState.sanity_check_current_state, for a (forward) state."""
+        if len(inventory) - inventory.count(0) > 10:
+            return False
+        sum_of_rem_balancepositive_trades, max_rem_outval_trade = self._get_remaining_trades_stats(bltrades_done)
+        goldvalue = sum(count * value for count, value in zip(inventory, ITEM_GOLDVALUES))
+        return goldvalue + sum_of_rem_balancepositive_trades >= max_rem_outval_trade
+
+    def reverse_trade(self, bltrades_done: int, inventory: Inventory, crafted: Inventory,
+                      trade: Type[Trade]) -> Iterator[Tuple[Inventory, Inventory, int]]:
+        """Yields (inventory, crafted, multiplier) for each state from which executing trade
+        results in inventory. bltrades_done is as after the trade.
+        """
+        they_pos, we_pos = ITEM_POS[trade.THEY_GET_ITEM], ITEM_POS[trade.WE_GET_ITEM]
+        if trade.IS_BOTTOM_LINE:
+            if not bltrades_done & (1 << INVERSEMAP_BOTTOMLINETRADES[trade]):
+                return
+            max_multiplier = min(1, inventory[we_pos] // trade.WE_GET_COUNT)
+        else:
+            if inventory[they_pos] >= trade.THEY_GET_COUNT:
+                return  # max-buy would have traded these too
+            max_multiplier = inventory[we_pos] // trade.WE_GET_COUNT
+        max_multiplier = min(max_multiplier,
+                             (self.items_crafted_cap[we_pos] - crafted[we_pos]) // trade.WE_GET_COUNT)
+        for multiplier in range(1, max_multiplier + 1):
+            pre_inventory = list(inventory)
+            pre_inventory[we_pos] -= multiplier * trade.WE_GET_COUNT
+            pre_inventory[they_pos] += multiplier * trade.THEY_GET_COUNT
+            pre_crafted = list(crafted)
+            pre_crafted[we_pos] += multiplier * trade.WE_GET_COUNT
+            yield tuple(pre_inventory), tuple(pre_crafted), multiplier
+
+    def reverse_chaincraft(self, bltrades_done: int, inventory: Inventory, crafted: Inventory,
+                           trade: Type[BottomLineTrade]) -> Iterator[Tuple[Inventory, Inventory]]:
+        """Yields (inventory, crafted) for each state from which chaincrafting trade (with the
+        optimal craft-sequence) results in inventory. bltrades_done is as after the chaincraft.
+        """
+        if not self.is_sane(bltrades_done, inventory):
+            return
+        pre_bltrades_done = bltrades_done & ~(1 << INVERSEMAP_BOTTOMLINETRADES[trade])
+        states = {(pre_inventory, pre_crafted)
+                  for pre_inventory, pre_crafted, multiplier in self.reverse_trade(bltrades_done, inventory, crafted, trade)}
+        for toplinetrade in reversed(CRAFTING_TRADECHAIN_FOR_TRADE[trade]):
+            pre_states = set(states)  # the trade might have not executed
+            for post_inventory, post_crafted in states:
+                if not self.is_sane(pre_bltrades_done, post_inventory):
+                    continue
+                for pre_inventory, pre_crafted, multiplier in self.reverse_trade(
+                        pre_bltrades_done, post_inventory, post_crafted, toplinetrade):
+                    pre_states.add((pre_inventory, pre_crafted))
+            states = pre_states
+        for pre_inventory, pre_crafted in states:
+            if self.is_sane(pre_bltrades_done, pre_inventory):
+                yield pre_inventory, pre_crafted
+
+
+class Perimeter:
+    """The states from which the goal might be reachable with at most `depth` chaincrafts,
+    by number of bottom-line trades done, as sets of state keys.
+    Built level by level, backwards from the goal. If a level would exceed max_states states,
+    it is dropped and the perimeter stops at the previous level.
+    """
+
+    def __init__(self, model: ReverseModel, depth: int, *, max_states: int = 5_000_000):
+        self.model = model
+        self.levels = {}  # type: Dict[int, Set[bytes]]
+        self.level_times = {}  # type: Dict[int, float]
+        self.num_lookups = 0
+        self.num_hits = 0
+        time_start = time.monotonic()
+        num_bltrades = len(BOTTOM_LINE_TRADES)
+        num_items = len(ITEMS)
+        # frontier states, packed: state key + crafted counts
+        frontier = {get_state_key(BOTTOM_LINE_TRADES_DONE_BITMAP, GOAL_INVENTORY)
+                    + array.array("H", [0] * num_items).tobytes()}
+        self.levels[num_bltrades] = {state[:5 + 2 * num_items] for state in frontier}
+        self.level_times[num_bltrades] = 0.0
+        for level in range(num_bltrades - 1, num_bltrades - 1 - depth, -1):
+            new_frontier = set()  # type: Set[bytes]
+            for state in frontier:
+                bltrades_done = int.from_bytes(state[:5], "little")
+                counts = array.array("H", state[5:])
+                inventory, crafted = tuple(counts[:num_items]), tuple(counts[num_items:])
+                for trade in BOTTOM_LINE_TRADES:
+                    if not bltrades_done & (1 << INVERSEMAP_BOTTOMLINETRADES[trade]):
+                        continue
+                    pre_bltrades_done = bltrades_done & ~(1 << INVERSEMAP_BOTTOMLINETRADES[trade])
+                    for pre_inventory, pre_crafted in model.reverse_chaincraft(bltrades_done, inventory, crafted, trade):
+                        new_frontier.add(get_state_key(pre_bltrades_done, pre_inventory)
+                                         + array.array("H", pre_crafted).tobytes())
+                if len(new_frontier) > max_states:
+                    break
+            if len(new_frontier) > max_states:
+                print(f"perimeter: level {level} has more than {max_states=} states; stopping at level {level + 1}")
+                break
+            frontier = new_frontier
+            self.levels[level] = {state[:5 + 2 * num_items] for state in frontier}
+            self.level_times[level] = time.monotonic() - time_start
+        self.min_level = min(self.levels)
+
+    def may_reach_goal(self, gs: hsutil.GameState) -> bool:
+        """Returns False if the state is known not to lead to the goal."""
+        level = bin(gs.bottomlinetrades_done).count("1")
+        if level < self.min_level:
+            return True
+        self.num_lookups += 1
+        if gs.get_state_key() in self.levels[level]:
+            self.num_hits += 1
+            return True
+        return False
+
+    def print_report(self) -> None:
+        for level in sorted(self.levels, reverse=True):
+            print(f"- level {level} (bottom trades done): {len(self.levels[level])} states. "
+                  f"built after {self.level_times[level]:.3f} seconds")
+        print(f"- forward states checked against the perimeter: {self.num_lookups}. found: {self.num_hits}")
@@ -5,14 +5,20 @@
 # Copyright (c) 2021 Laszlo Makk
 #
 
+import argparse
+import array
 import collections
-from collections import defaultdict, deque
+from collections import defaultdict, OrderedDict
 import enum
+import heapq
 from enum import IntEnum
 import random
 import sys
 import time
-from typing import Dict, List, Tuple, Set, Type, Sequence, Mapping, Optional
+from typing import Any, Dict, Iterable, List, Tuple, Set, Type, Sequence, Mapping, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import hsbounds  # circular: hsbounds imports hsutil
 
 
 class Item(IntEnum):
@@ -482,31 +488,94 @@ class TradeBottom7DOA(BottomLineTrade):
 
 #########################
 # Compute best value of items based on top-line trades.
+# The functions below work on anything with the attributes of a Trade (items need not be Items),
+# so that they can be benchmarked on generated puzzles (see benchmark_derivation.py).
+
+def derive_best_crafting_trades(trades, *, base_item) -> Tuple[Dict, Dict, List]:
+    """Finds the cheapest way to craft each item, starting from base_item (worth 1).
+    This is a shortest-path tree (Dijkstra's algorithm), where crafting one of WE_GET_ITEM costs
+    THEY_GET_COUNT times the cost of THEY_GET_ITEM; as counts are >= 1, costs only grow along paths.
+    O((items + trades) log items).
+    Returns (goldvalue_of_item, besttrade_to_craft_item, items in the order they were settled).
+    Items that cannot be crafted are left out. Raises if an item has multiple optimal trades.
+    """
+    trades_by_ingredient = defaultdict(list)
+    for trade in trades:
+        assert trade.WE_GET_COUNT == 1
+        trades_by_ingredient[trade.THEY_GET_ITEM].append(trade)
+    goldvalue_of_item = {base_item: 1}
+    besttrade_to_craft_item = {base_item: None}
+    tied_goldvalue = {}  # item -> goldvalue reached by a trade other than the best one
+    settled_order = []
+    heap = [(1, 0, base_item)]  # (goldvalue, tiebreak, item); items need not be comparable
+    num_pushed = 1
+    while heap:
+        goldvalue, _, item = heapq.heappop(heap)
+        if goldvalue > goldvalue_of_item[item]:
+            continue  # stale entry
+        settled_order.append(item)
+        for trade in trades_by_ingredient[item]:
+            price = goldvalue * trade.THEY_GET_COUNT
+            product = trade.WE_GET_ITEM
+            old_goldvalue = goldvalue_of_item.get(product)
+            if old_goldvalue is None or price < old_goldvalue:
+                goldvalue_of_item[product] = price
+                besttrade_to_craft_item[product] = trade
+                heapq.heappush(heap, (price, num_pushed, product))
+                num_pushed += 1
+            elif price == old_goldvalue and trade != besttrade_to_craft_item[product]:
+                tied_goldvalue[product] = price
+    for item, goldvalue in tied_goldvalue.items():
+        if goldvalue == goldvalue_of_item[item]:
+            raise Exception(f"found multiple optimal paths to craft item! {item}")
+    return goldvalue_of_item, besttrade_to_craft_item, settled_order
+
+
+def derive_crafting_chains(besttrade_to_craft_item: Mapping, settled_order: Sequence) -> Tuple[Dict, Dict]:
+    """Returns (tradechain_for_item, itemchain_for_item); see CRAFTING_TRADECHAIN_FOR_ITEM.
+    The chain of an item extends the chain of its ingredient, which was settled before it,
+    so this is linear in the total length of the chains.
+    """
+    tradechain_for_item = {}
+    itemchain_for_item = {}
+    for item in settled_order:
+        trade = besttrade_to_craft_item[item]
+        if trade is None:  # base_item
+            tradechain_for_item[item] = ()
+            itemchain_for_item[item] = ((item, 1),)
+            continue
+        count = trade.THEY_GET_COUNT
+        tradechain_for_item[item] = ((trade, 1),) + tuple(
+            (tr, count * mult) for tr, mult in tradechain_for_item[trade.THEY_GET_ITEM])
+        itemchain_for_item[item] = ((item, 1),) + tuple(
+            (it, count * mult) for it, mult in itemchain_for_item[trade.THEY_GET_ITEM])
+    return tradechain_for_item, itemchain_for_item
+
+
+def derive_items_needed(demands: Iterable[Tuple[Any, int]], besttrade_to_craft_item: Mapping,
+                        settled_order: Sequence) -> Dict:
+    """Returns how many of each item have to be crafted overall (crafting everything optimally)
+    to satisfy the demands, given as (item, count) pairs.
+    Demand flows from each item to its ingredient, which was settled before it, so processing
+    items in reverse settled order, each is visited once: O(items + demands).
+    """
+    items_needed = defaultdict(int)
+    for item, count in demands:
+        items_needed[item] += count
+    for item in reversed(settled_order):
+        trade = besttrade_to_craft_item[item]
+        if trade is not None and items_needed.get(item):
+            items_needed[trade.THEY_GET_ITEM] += trade.THEY_GET_COUNT * items_needed[item]
+    return items_needed
 
-TOP_LINE_TRADES_ANY = tuple(TopLineTrade.__subclasses__())  # type: Sequence[Type[TopLineTrade]]
 
-while True:
-    updated_anything = False
-    for item in Item.__members__.values():
-        for trade in TOP_LINE_TRADES_ANY:
-            assert trade.WE_GET_COUNT == 1
-            if trade.WE_GET_ITEM != item:
-                continue
-            price = GOLDVALUE_OF_ITEM.get(trade.THEY_GET_ITEM, None)
-            if price is None:
-                continue
-            price *= trade.THEY_GET_COUNT
+TOP_LINE_TRADES_ANY = tuple(TopLineTrade.__subclasses__())  # type: Sequence[Type[TopLineTrade]]
 
-            old_besttrade = BESTTRADE_TO_CRAFT_ITEM.get(item)
-            old_goldval = GOLDVALUE_OF_ITEM.get(item, float("inf"))
-            if price < old_goldval:
-                GOLDVALUE_OF_ITEM[item] = price
-                BESTTRADE_TO_CRAFT_ITEM[item] = trade
-                updated_anything = True
-            elif price == old_goldval and trade != old_besttrade:
-                assert False, "found multiple optimal paths to craft item!"
-    if not updated_anything:
-        break
+_goldvalues, _besttrades, _ITEMS_SETTLED_ORDER = derive_best_crafting_trades(TOP_LINE_TRADES_ANY, base_item=Item.GOLD)
+GOLDVALUE_OF_ITEM.update(_goldvalues)
+BESTTRADE_TO_CRAFT_ITEM.update(_besttrades)
+assert len(GOLDVALUE_OF_ITEM) == len(Item)
+del _goldvalues, _besttrades
 
 
 #########################
@@ -514,9 +583,16 @@ while True:
 BOTTOM_LINE_TRADES = tuple(BottomLineTrade.__subclasses__())  # type: Sequence[Type[BottomLineTrade]]
 TOP_LINE_TRADES_ONLY_GOOD = tuple(cls for cls in TOP_LINE_TRADES_ANY if cls.delta_balance() >= 0)  # type: Sequence[Type[TopLineTrade]]
 ALL_GOOD_TRADES = tuple(trade for trade in (list(BOTTOM_LINE_TRADES) + list(TOP_LINE_TRADES_ONLY_GOOD)))  # type: Sequence[Type[Trade]]
+# Bad top-line trades are only used when not assuming observation 4.
+# As any solution ends with a non-negative inventory-value, we can lose at most STARTING_GOLD
+# of value overall, hence trades that lose more than that even once can never be part of a solution.
+TOP_LINE_TRADES_BAD_AFFORDABLE = tuple(cls for cls in TOP_LINE_TRADES_ANY
+                                       if -STARTING_GOLD <= cls.delta_balance() < 0)  # type: Sequence[Type[TopLineTrade]]
+# note: bad trades are appended at the end, so that indices of ALL_GOOD_TRADES are unchanged
+ALL_TRADES_ANY = ALL_GOOD_TRADES + TOP_LINE_TRADES_BAD_AFFORDABLE  # type: Sequence[Type[Trade]]
 
 INVERSEMAP_BOTTOMLINETRADES = {trade: idx for idx, trade in enumerate(BOTTOM_LINE_TRADES)}  # type: Mapping[Type[BottomLineTrade], int]
-INVERSEMAP_ALLTRADES        = {trade: idx for idx, trade in enumerate(ALL_GOOD_TRADES)}  # type: Mapping[Type[Trade], int]
+INVERSEMAP_ALLTRADES        = {trade: idx for idx, trade in enumerate(ALL_TRADES_ANY)}  # type: Mapping[Type[Trade], int]
 
 BOTTOM_LINE_TRADES_DONE_BITMAP = (1 << len(BOTTOM_LINE_TRADES)) - 1
 
@@ -531,39 +607,104 @@ BOTTOM_LINE_TRADES_DONE_BITMAP = (1 << len(BOTTOM_LINE_TRADES)) - 1
 # note: ITEMS_OVERALL_NEEDED_FOR_GOAL does not account for STARTING_GOLD,
 #       as gamestate.items_crafted_ever does not include it either.
 
-ITEMS_OVERALL_NEEDED_FOR_GOAL = defaultdict(int)  # type: Dict[Item, int]
-_crafting_queue = deque()  # type: collections.deque[Tuple[Item, int]]
-for trade in BOTTOM_LINE_TRADES:
-    _crafting_queue.append((trade.THEY_GET_ITEM, trade.THEY_GET_COUNT))
-while len(_crafting_queue) > 0:
-    to_craft_item, to_craft_count = _crafting_queue.popleft()
-    ITEMS_OVERALL_NEEDED_FOR_GOAL[to_craft_item] += to_craft_count
-    if to_craft_item == Item.GOLD:
-        continue
-    trade = BESTTRADE_TO_CRAFT_ITEM[to_craft_item]
-    _crafting_queue.append((trade.THEY_GET_ITEM, trade.THEY_GET_COUNT * to_craft_count))
-
-del _crafting_queue
+ITEMS_OVERALL_NEEDED_FOR_GOAL = derive_items_needed(
+    ((trade.THEY_GET_ITEM, trade.THEY_GET_COUNT) for trade in BOTTOM_LINE_TRADES),
+    BESTTRADE_TO_CRAFT_ITEM, _ITEMS_SETTLED_ORDER)  # type: Dict[Item, int]
 
 #########################
 
-CRAFTING_TRADECHAIN_FOR_ITEM = defaultdict(list)  # type: Dict[Item, Sequence[Tuple[Type[TopLineTrade], int]]]
-CRAFTING_ITEMCHAIN_FOR_ITEM = defaultdict(list)  # type: Dict[Item, Sequence[Tuple[Item, int]]]
-for item in Item.__members__.values():
-    ingredient = item
-    multiplier = 1
-    while ingredient != Item.GOLD:
-        CRAFTING_ITEMCHAIN_FOR_ITEM[item].append((ingredient, multiplier))
-        CRAFTING_TRADECHAIN_FOR_ITEM[item].append((BESTTRADE_TO_CRAFT_ITEM[ingredient], multiplier))
-        multiplier *= BESTTRADE_TO_CRAFT_ITEM[ingredient].THEY_GET_COUNT
-        ingredient = BESTTRADE_TO_CRAFT_ITEM[ingredient].THEY_GET_ITEM
-    CRAFTING_ITEMCHAIN_FOR_ITEM[item].append((ingredient, multiplier))
-    CRAFTING_TRADECHAIN_FOR_ITEM[item] = tuple(CRAFTING_TRADECHAIN_FOR_ITEM[item])
-    CRAFTING_ITEMCHAIN_FOR_ITEM[item] = tuple(CRAFTING_ITEMCHAIN_FOR_ITEM[item])
+_tradechains, _itemchains = derive_crafting_chains(BESTTRADE_TO_CRAFT_ITEM, _ITEMS_SETTLED_ORDER)
+CRAFTING_TRADECHAIN_FOR_ITEM = defaultdict(list, _tradechains)  # type: Dict[Item, Sequence[Tuple[Type[TopLineTrade], int]]]
+CRAFTING_ITEMCHAIN_FOR_ITEM = defaultdict(list, _itemchains)  # type: Dict[Item, Sequence[Tuple[Item, int]]]
+del _tradechains, _itemchains
 
 CRAFTING_TRADECHAIN_FOR_TRADE = defaultdict(list)  # type: Dict[Type[BottomLineTrade], Sequence[Type[TopLineTrade]]]
 for trade in BOTTOM_LINE_TRADES:
     CRAFTING_TRADECHAIN_FOR_TRADE[trade] = tuple(tr for tr, mult in CRAFTING_TRADECHAIN_FOR_ITEM[trade.THEY_GET_ITEM][::-1])
+# the items whose counts a chaincraft of the trade (with the optimal trade-sequence) depends on
+CRAFTING_ITEMS_FOR_TRADE = {trade: tuple(item for item, mult in CRAFTING_ITEMCHAIN_FOR_ITEM[trade.THEY_GET_ITEM])
+                            for trade in BOTTOM_LINE_TRADES}  # type: Dict[Type[BottomLineTrade], Sequence[Item]]
+
+#########################
+# Without observation 4, items can also be crafted using bad top-line trades.
+# For each bottom-line trade, list all trade-sequences to craft the items it needs,
+# where the value lost while crafting is at most STARTING_GOLD. The optimal one is first.
+
+def _list_crafting_routes_for_item(item: Item, visited: Tuple[Item, ...] = ()) -> List[Tuple[Tuple[Type[TopLineTrade], ...], int]]:
+    """Returns list of (trade-sequence, gold cost) pairs, to craft one of item."""
+    if item == Item.GOLD:
+        return [((), 1)]
+    routes = []
+    for trade in TOP_LINE_TRADES_ANY:
+        if trade.WE_GET_ITEM != item or trade.THEY_GET_ITEM in visited:
+            continue
+        for subroute, subcost in _list_crafting_routes_for_item(trade.THEY_GET_ITEM, visited + (item,)):
+            routes.append((subroute + (trade,), subcost * trade.THEY_GET_COUNT))
+    return routes
+
+CRAFTING_TRADECHAINS_FOR_TRADE_ANY = {}  # type: Dict[Type[BottomLineTrade], Sequence[Sequence[Type[TopLineTrade]]]]
+for trade in BOTTOM_LINE_TRADES:
+    _routes = [(trade.THEY_GET_COUNT * (cost - trade.THEY_GET_ITEM.goldvalue()), route)
+               for route, cost in _list_crafting_routes_for_item(trade.THEY_GET_ITEM)]
+    _routes.sort(key=lambda x: x[0])
+    CRAFTING_TRADECHAINS_FOR_TRADE_ANY[trade] = tuple(route for loss, route in _routes if loss <= STARTING_GOLD)
+    assert CRAFTING_TRADECHAINS_FOR_TRADE_ANY[trade][0] == CRAFTING_TRADECHAIN_FOR_TRADE[trade]
+del _routes
+
+# bitmaps (bit i is for item with value i) of non-GOLD items that might still be useful
+# for executing the bottom-line trade with the same index in BOTTOM_LINE_TRADES
+ITEMBITMAPS_USED_FOR_BLTRADES = tuple(
+    sum(1 << item for item in
+        {tr.THEY_GET_ITEM for route in CRAFTING_TRADECHAINS_FOR_TRADE_ANY[trade] for tr in route} | {trade.THEY_GET_ITEM}
+        if item != Item.GOLD)
+    for trade in BOTTOM_LINE_TRADES
+)  # type: Sequence[int]
+
+
+def _list_items_usable_for_item(item: Item) -> Set[Item]:
+    """Returns the items that any sequence of good or affordable bad top-line trades can turn into item."""
+    usable = {item}
+    updated_anything = True
+    while updated_anything:
+        updated_anything = False
+        for trade in TOP_LINE_TRADES_ONLY_GOOD + TOP_LINE_TRADES_BAD_AFFORDABLE:
+            if trade.WE_GET_ITEM in usable and trade.THEY_GET_ITEM not in usable:
+                usable.add(trade.THEY_GET_ITEM)
+                updated_anything = True
+    return usable
+
+# as ITEMBITMAPS_USED_FOR_BLTRADES, but for single trades (without observation 7) and without observation 4:
+# a bad trade might then be executed for only part of what a craft-sequence needs, so the per-unit loss
+# (at most STARTING_GOLD) is what limits it, not the loss of the whole craft-sequence.
+ITEMBITMAPS_USABLE_FOR_BLTRADES_ANY = tuple(
+    sum(1 << item for item in _list_items_usable_for_item(trade.THEY_GET_ITEM) if item != Item.GOLD)
+    for trade in BOTTOM_LINE_TRADES
+)  # type: Sequence[int]
+
+
+def get_items_crafted_cap(*, allow_bad_trades: bool = False, allow_leftover_items: bool = False) -> Dict[Item, int]:
+    """Returns the max number of each item we will ever craft (see observation 5).
+    With both assumptions in place, this is ITEMS_OVERALL_NEEDED_FOR_GOAL.
+    - allow_leftover_items: the final inventory might contain non-GOLD items.
+      Its value is at most STARTING_GOLD, so for any item we might craft
+      STARTING_GOLD // goldvalue extra pieces (to keep, or to craft other leftover items with).
+    - allow_bad_trades: each bad trade can only be executed STARTING_GOLD // loss times overall.
+      Each such execution might need the ingredients of the bad trade crafted extra.
+      Note that this implies allow_leftover_items, as any loss means we cannot finish with 10xGOLD.
+    """
+    cap = defaultdict(int, ITEMS_OVERALL_NEEDED_FOR_GOAL)  # type: Dict[Item, int]
+    if not (allow_bad_trades or allow_leftover_items):
+        return cap
+    for item in Item.__members__.values():
+        if item != Item.GOLD:
+            cap[item] += STARTING_GOLD // item.goldvalue()
+    if allow_bad_trades:
+        for trade in TOP_LINE_TRADES_BAD_AFFORDABLE:
+            max_times = STARTING_GOLD // -trade.delta_balance()
+            for item, multiplier in CRAFTING_ITEMCHAIN_FOR_ITEM[trade.THEY_GET_ITEM]:
+                if item != Item.GOLD:
+                    cap[item] += max_times * trade.THEY_GET_COUNT * multiplier
+    return cap
 
 
 #########################
@@ -574,19 +715,153 @@ def list_enabled_bits(x: int) -> Sequence[int]:
     return tuple(i for i, b in enumerate(rev_bin) if b == '1')
 
 
+#########################
+
+class TradeHistory:
+    """Trades executed so far, each coupled with a multiplier.
+    Behaves like a list of (trade, multiplier) tuples, but is stored as two packed arrays:
+    indices into ALL_TRADES_ANY, and multipliers. append/pop are O(1), copies are cheap
+    (and small to pickle), and tuples are only created when items are read.
+    """
+    __slots__ = ("trade_idxs", "multipliers")
+
+    def __init__(self, actions: Sequence[Tuple[Type[Trade], int]] = ()):
+        self.trade_idxs = array.array("B")
+        self.multipliers = array.array("H")
+        for action in actions:
+            self.append(action)
+
+    def append(self, action: Tuple[Type[Trade], int]) -> None:
+        trade, multiplier = action
+        self.trade_idxs.append(INVERSEMAP_ALLTRADES[trade])
+        self.multipliers.append(multiplier)
+
+    def extend(self, other: 'TradeHistory') -> None:
+        self.trade_idxs.extend(other.trade_idxs)
+        self.multipliers.extend(other.multipliers)
+
+    def truncate(self, length: int) -> None:
+        del self.trade_idxs[length:]
+        del self.multipliers[length:]
+
+    def pop(self) -> Tuple[Type[Trade], int]:
+        return ALL_TRADES_ANY[self.trade_idxs.pop()], self.multipliers.pop()
+
+    def pop_idx(self) -> Tuple[int, int]:
+        """Like pop(), but returns the index of the trade (in ALL_TRADES_ANY)."""
+        return self.trade_idxs.pop(), self.multipliers.pop()
+
+    def copy(self) -> 'TradeHistory':
+        history = TradeHistory()
+        history.trade_idxs = self.trade_idxs[:]
+        history.multipliers = self.multipliers[:]
+        return history
+
+    def __len__(self) -> int:
+        return len(self.trade_idxs)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            history = TradeHistory()
+            history.trade_idxs = self.trade_idxs[idx]
+            history.multipliers = self.multipliers[idx]
+            return history
+        return ALL_TRADES_ANY[self.trade_idxs[idx]], self.multipliers[idx]
+
+    def __iter__(self):
+        for trade_idx, multiplier in zip(self.trade_idxs, self.multipliers):
+            yield ALL_TRADES_ANY[trade_idx], multiplier
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, TradeHistory):
+            return self.trade_idxs == other.trade_idxs and self.multipliers == other.multipliers
+        return list(self) == other
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+#########################
+
+class ChaincraftPlan:
+    """What chaincrafting a bottom-line trade with the optimal craft-sequence does, as a function
+    of the counts of the items in its crafting chain (CRAFTING_ITEMS_FOR_TRADE) only.
+    Every top-line trade of the chain is max-buy, and none of them change the inventory-value,
+    so ignoring items_crafted_cap and sanity checks (which GameState checks against the plan),
+    - history: the top-line trades executed (the ones with multiplier 0 are left out);
+    - inventory_deltas, items_crafted: their net effect, as (item, count) pairs;
+    - itemtypes_delta: the change of the number of item-types in the inventory,
+      and max_itemtypes_delta: the max of that after any of the trades;
+    - sufficient: whether we will have the items needed for the bottom-line trade in the end.
+      Skipping trades can only leave us with fewer of them, so if not, the chaincraft surely fails.
+    """
+    __slots__ = ("history", "inventory_deltas", "items_crafted", "itemtypes_delta", "max_itemtypes_delta",
+                 "sufficient")
+
+    def __init__(self, trade: Type[BottomLineTrade], chain_counts: Sequence[int]):
+        inventory = dict(zip(CRAFTING_ITEMS_FOR_TRADE[trade], chain_counts))
+        # same as GameState.has_enough_to_chaincraft_bltrade
+        our_relevant_inventory_value = sum(count * item.goldvalue() for item, count in inventory.items())
+        has_enough = our_relevant_inventory_value >= CRAFTING_ITEMCHAIN_FOR_ITEM[trade.THEY_GET_ITEM][-1][1] * trade.THEY_GET_COUNT
+        self.history = TradeHistory()
+        items_crafted = []  # type: List[Tuple[Item, int]]
+        self.itemtypes_delta = 0
+        self.max_itemtypes_delta = 0
+        for toplinetrade in CRAFTING_TRADECHAIN_FOR_TRADE[trade]:
+            multiplier = inventory[toplinetrade.THEY_GET_ITEM] // toplinetrade.THEY_GET_COUNT
+            if multiplier == 0:
+                continue
+            if inventory[toplinetrade.WE_GET_ITEM] == 0:
+                self.itemtypes_delta += 1
+            inventory[toplinetrade.THEY_GET_ITEM] -= multiplier * toplinetrade.THEY_GET_COUNT
+            inventory[toplinetrade.WE_GET_ITEM] += multiplier * toplinetrade.WE_GET_COUNT
+            if inventory[toplinetrade.THEY_GET_ITEM] == 0:
+                self.itemtypes_delta -= 1
+            self.max_itemtypes_delta = max(self.max_itemtypes_delta, self.itemtypes_delta)
+            # the items of a chain are distinct, so each item is crafted by at most one trade
+            items_crafted.append((toplinetrade.WE_GET_ITEM, multiplier * toplinetrade.WE_GET_COUNT))
+            self.history.append((toplinetrade, multiplier))
+        self.inventory_deltas = tuple((item, inventory[item] - count)
+                                      for item, count in zip(CRAFTING_ITEMS_FOR_TRADE[trade], chain_counts)
+                                      if inventory[item] != count)  # type: Sequence[Tuple[Item, int]]
+        self.items_crafted = tuple(items_crafted)  # type: Sequence[Tuple[Item, int]]
+        self.sufficient = has_enough and inventory[trade.THEY_GET_ITEM] >= trade.THEY_GET_COUNT
+
+
 #########################
 
 class GameState:
 
-    def __init__(self):
+    def __init__(self, *, allow_bad_trades: bool = False, allow_leftover_items: bool = False,
+                 chaincraft_cache_size: int = 0):
+        """The default arguments correspond to assuming observations 4 and 5.
+        chaincraft_cache_size: max number of ChaincraftPlans kept (least recently used are evicted); 0 disables.
+          For this puzzle, it does not pay off: the chains are short, and most chaincrafts are
+          already rejected by has_enough_to_chaincraft_bltrade.
+        """
+        self.allow_bad_trades = allow_bad_trades
+        self.allow_leftover_items = allow_leftover_items or allow_bad_trades
+        self.items_crafted_cap = get_items_crafted_cap(allow_bad_trades=self.allow_bad_trades,
+                                                       allow_leftover_items=self.allow_leftover_items)
+        # inventory-value lost by executing bad top-line trades
+        self.value_lost = 0
+        self.max_value_lost = STARTING_GOLD if allow_bad_trades else 0
+        # optional extra bounds checked by sanity_check_current_state (see hsbounds.py)
+        self.extra_bounds = []  # type: List[hsbounds.Bound]
         self.cur_inventory = defaultdict(int)  # type: Dict[Item, int]
         self.cur_inventory[Item.GOLD] = STARTING_GOLD
         self.cur_inventory_goldvalue = STARTING_GOLD  # assuming every item was converted to gold
         self.cur_inventory_num_itemtypes = 1  # how many different types of items we have currently
         self.items_crafted_ever = defaultdict(int)  # type: Dict[Item, int]
         # each history item is a trade already executed, coupled with a multiplier
-        self.history = []  # type: List[Tuple[Type[Trade], int]]
+        self.history = TradeHistory()
         self._chaincraft_undo_history = []  # type: List[int]
+        self._chaincraft_undo_plans = []  # type: List[Optional[ChaincraftPlan]]  # if executed from a plan
+        # (bottom-line trade, counts of the items in its crafting chain) -> plan
+        self._chaincraft_plans = OrderedDict()  # type: collections.OrderedDict[Tuple[Type[BottomLineTrade], Tuple[int, ...]], ChaincraftPlan]
+        self.chaincraft_cache_size = chaincraft_cache_size
+        self.chaincraft_cache_lookups = 0
+        self.chaincraft_cache_hits = 0
         self.bottomlinetrades_done = 0  # type: int  # bitmap for indices of BOTTOM_LINE_TRADES
         # keep account of remaining trades that can increase cur_inventory_goldvalue
         self.sum_of_rem_balancepositive_trades = sum(trade.delta_balance() for trade in BOTTOM_LINE_TRADES
@@ -614,7 +889,7 @@ class GameState:
         # we precalculated counts for each item we will ever need to craft;
         # make sure that is not exceeded.
         if (self.items_crafted_ever[trade.WE_GET_ITEM] + multiplier * trade.WE_GET_COUNT
-                > ITEMS_OVERALL_NEEDED_FOR_GOAL[trade.WE_GET_ITEM]):
+                > self.items_crafted_cap[trade.WE_GET_ITEM]):
             return False
         # we have now decided to execute the trade.
         if self.cur_inventory[trade.WE_GET_ITEM] == 0:
@@ -626,6 +901,8 @@ class GameState:
         self.items_crafted_ever[trade.WE_GET_ITEM] += multiplier * trade.WE_GET_COUNT
         self.cur_inventory_goldvalue += multiplier * trade.delta_balance()
         self.history.append((trade, multiplier))
+        if not trade.IS_BOTTOM_LINE and trade.delta_balance() < 0:
+            self.value_lost -= multiplier * trade.delta_balance()
         if trade.IS_BOTTOM_LINE:
             self.bottomlinetrades_done += 1 << INVERSEMAP_BOTTOMLINETRADES[trade]
             if trade.delta_balance() > 0:
@@ -642,7 +919,8 @@ class GameState:
         """Returns index of trade undone."""
         if not self.history:
             raise Exception("no solution")
-        trade, multiplier = self.history.pop()
+        trade_idx, multiplier = self.history.pop_idx()
+        trade = ALL_TRADES_ANY[trade_idx]
         if self.cur_inventory[trade.THEY_GET_ITEM] == 0:
             self.cur_inventory_num_itemtypes += 1
         self.cur_inventory[trade.THEY_GET_ITEM] += multiplier * trade.THEY_GET_COUNT
@@ -651,13 +929,15 @@ class GameState:
             self.cur_inventory_num_itemtypes -= 1
         self.items_crafted_ever[trade.WE_GET_ITEM] -= multiplier * trade.WE_GET_COUNT
         self.cur_inventory_goldvalue -= multiplier * trade.delta_balance()
+        if not trade.IS_BOTTOM_LINE and trade.delta_balance() < 0:
+            self.value_lost += multiplier * trade.delta_balance()
         if trade.IS_BOTTOM_LINE:
             self.bottomlinetrades_done -= 1 << INVERSEMAP_BOTTOMLINETRADES[trade]
             if trade.delta_balance() > 0:
                 self.sum_of_rem_balancepositive_trades += trade.delta_balance()
             if trade.outvalue() > self.max_rem_outval_trade:
                 self._recalc_max_rem_outval_trade()
-        return INVERSEMAP_ALLTRADES[trade]
+        return trade_idx
 
     def has_enough_to_chaincraft_bltrade(self, trade: Type[BottomLineTrade]) -> bool:
         """Returns whether we can execute the given bottom-line-trade (sell to adventurer),
@@ -673,19 +953,39 @@ class GameState:
         gold_needed = itemchain[-1][1] * trade.THEY_GET_COUNT
         return our_relevant_inventory_value >= gold_needed
 
-    def chaincraft_bltrade(self, trade: Type[BottomLineTrade]) -> bool:
+    def chaincraft_bltrade(self, trade: Type[BottomLineTrade],
+                           tradechain: Optional[Sequence[Type[TopLineTrade]]] = None) -> bool:
         """Execute the given bottom-line-trade (sell to adventurer),
         including crafting the required items (doing potentially many top-line-trades, but
         without doing other bottom-line-trades).
+        By default the items are crafted using the optimal trade-sequence; a different one
+        (see CRAFTING_TRADECHAINS_FOR_TRADE_ANY) can be given as tradechain.
         Returns whether the chaincraft was executed.
         """
         # shortcut (duplicated from "do_trade"): bottom-line trades can only be executed once
         if self.bottomlinetrades_done & (1 << INVERSEMAP_BOTTOMLINETRADES[trade]):
             return False
-        if not self.has_enough_to_chaincraft_bltrade(trade):
-            return False
+        if tradechain is None:
+            # note: the precheck is only valid for the optimal trade-sequence
+            if not self.has_enough_to_chaincraft_bltrade(trade):
+                return False
+        if (self.chaincraft_cache_size and not self.extra_bounds
+                and (tradechain is None or tradechain == CRAFTING_TRADECHAIN_FOR_TRADE[trade])):
+            plan = self._get_chaincraft_plan(trade)
+            if not plan.sufficient:
+                return False
+            if self._execute_chaincraft_plan(plan):
+                # now execute the bottom-line trade. if this fails, we need to undo everything
+                if not self.do_trade(trade):
+                    self.undo_last_chaincraft()
+                    return False
+                return True
+            # otherwise some step of the plan would not execute: fall back to doing it trade-by-trade
+        if tradechain is None:
+            tradechain = CRAFTING_TRADECHAIN_FOR_TRADE[trade]
         self._chaincraft_undo_history.append(len(self.history))
-        for toplinetrade in CRAFTING_TRADECHAIN_FOR_TRADE[trade]:
+        self._chaincraft_undo_plans.append(None)
+        for toplinetrade in tradechain:
             # note: The first few trades might not execute (return False),
             #       if they are unnecessary. This is fine.
             self.do_trade(toplinetrade)
@@ -695,6 +995,44 @@ class GameState:
             return False
         return True
 
+    def _get_chaincraft_plan(self, trade: Type[BottomLineTrade]) -> ChaincraftPlan:
+        self.chaincraft_cache_lookups += 1
+        key = (trade, tuple(map(self.cur_inventory.__getitem__, CRAFTING_ITEMS_FOR_TRADE[trade])))
+        plan = self._chaincraft_plans.get(key)
+        if plan is not None:
+            self.chaincraft_cache_hits += 1
+            self._chaincraft_plans.move_to_end(key)
+            return plan
+        plan = ChaincraftPlan(trade, key[1])
+        self._chaincraft_plans[key] = plan
+        if len(self._chaincraft_plans) > self.chaincraft_cache_size:
+            self._chaincraft_plans.popitem(last=False)
+        return plan
+
+    def _execute_chaincraft_plan(self, plan: ChaincraftPlan) -> bool:
+        """Executes the top-line trades of the plan at once, if do_trade would execute every one of them
+        (i.e. no items_crafted_cap is exceeded, and every intermediate state is sane).
+        Otherwise, returns False without changing anything.
+        """
+        # the inventory-value does not change during the plan, so the checks of
+        # sanity_check_current_state only differ in the number of item-types
+        if (self.cur_inventory_goldvalue + self.sum_of_rem_balancepositive_trades < self.max_rem_outval_trade
+                or self.cur_inventory_num_itemtypes + plan.max_itemtypes_delta > 10
+                or self.value_lost > self.max_value_lost):
+            return False
+        for item, count in plan.items_crafted:
+            if self.items_crafted_ever[item] + count > self.items_crafted_cap[item]:
+                return False
+        self._chaincraft_undo_history.append(len(self.history))
+        self._chaincraft_undo_plans.append(plan)
+        for item, delta in plan.inventory_deltas:
+            self.cur_inventory[item] += delta
+        for item, count in plan.items_crafted:
+            self.items_crafted_ever[item] += count
+        self.cur_inventory_num_itemtypes += plan.itemtypes_delta
+        self.history.extend(plan.history)
+        return True
+
     def undo_last_chaincraft(self) -> Optional[int]:
         """Returns index of the undone bottom-line-trade-chaincrafted.
         Might return None, but only if undoing a partially-executed chaincraft.
@@ -702,6 +1040,7 @@ class GameState:
         if not self._chaincraft_undo_history:
             raise Exception("no solution")
         hist_idx = self._chaincraft_undo_history.pop()
+        plan = self._chaincraft_undo_plans.pop()
         if not self.history:  # the chaincraft was only partially-executed
             return None
         assert len(self.history) >= hist_idx
@@ -710,6 +1049,17 @@ class GameState:
             bottomlinetrade_idx = INVERSEMAP_BOTTOMLINETRADES[final_trade]
         else:  # the chaincraft was only partially-executed
             bottomlinetrade_idx = None
+        if plan is not None and len(self.history) >= hist_idx + len(plan.history):
+            # undo the trades after the plan one-by-one, then the plan at once
+            for _ in range(len(self.history) - hist_idx - len(plan.history)):
+                self.undo_last_trade()
+            for item, delta in plan.inventory_deltas:
+                self.cur_inventory[item] -= delta
+            for item, count in plan.items_crafted:
+                self.items_crafted_ever[item] -= count
+            self.cur_inventory_num_itemtypes -= plan.itemtypes_delta
+            self.history.truncate(hist_idx)
+            return bottomlinetrade_idx
         for _ in range(len(self.history) - hist_idx):
             self.undo_last_trade()
         return bottomlinetrade_idx
@@ -725,11 +1075,33 @@ class GameState:
         # if we have too many different cards in hand, then cut DFS
         if self.cur_inventory_num_itemtypes > 10:
             return False
+        # the final inventory-value cannot be negative
+        if self.value_lost > self.max_value_lost:
+            return False
+        for bound in self.extra_bounds:
+            if not bound.is_sane(self):
+                return False
         return True
 
+    def get_state_key(self) -> bytes:
+        """Returns a compact key identifying the current state, for transposition tables.
+        Only bad trades make items_crafted_ever not a function of the inventory and
+        bottomlinetrades_done, so only in that case is it part of the key.
+        """
+        counts = array.array("H", [self.cur_inventory[item] for item in Item])
+        if self.allow_bad_trades:
+            counts.extend(self.items_crafted_ever[item] for item in Item)
+        return self.bottomlinetrades_done.to_bytes(5, "little") + counts.tobytes()
+
     def is_complete(self) -> bool:
         return self.bottomlinetrades_done == BOTTOM_LINE_TRADES_DONE_BITMAP
 
+    def get_progress_score(self) -> Tuple[int, int]:
+        """Returns (number of bottom-line trades done, inventory-value).
+        Used for ranking partial states; higher is better.
+        """
+        return bin(self.bottomlinetrades_done).count("1"), self.cur_inventory_goldvalue
+
     def get_cur_inventory_num_itemtypes_excl_gold(self) -> int:
         if self.cur_inventory[Item.GOLD] == 0:
             return self.cur_inventory_num_itemtypes
@@ -748,8 +1120,14 @@ class GameState:
         inventory = self.get_nonzero_inventory()
         print(f"- {len(self.history)=}. inventory({len(inventory)})={inventory}")
         print(f"- {self.cur_inventory_goldvalue=}. {self.sum_of_rem_balancepositive_trades=}. {self.max_rem_outval_trade=}")
+        if self.allow_bad_trades:
+            print(f"- {self.value_lost=}")
         print(f"- bottom trades bitmap: {bin(self.bottomlinetrades_done)}")
         print(f"- bottom trades done: {[str(trade) for trade, mult in self.history if trade.IS_BOTTOM_LINE]}")
+        if self.chaincraft_cache_lookups:
+            print(f"- chaincraft cache: size={len(self._chaincraft_plans)}. lookups={self.chaincraft_cache_lookups}. "
+                  f"hits={self.chaincraft_cache_hits} "
+                  f"({100 * self.chaincraft_cache_hits / self.chaincraft_cache_lookups:.1f}%)")
 
     def get_nonzero_inventory(self) -> Dict[Item, int]:
         return {
@@ -758,7 +1136,104 @@ class GameState:
         }
 
     def dump_history_trade_idx_ints(self) -> Sequence[int]:
-        return [INVERSEMAP_ALLTRADES[trade] for trade, mult in self.history]
+        return self.history.trade_idxs.tolist()
+
+
+class RefutedStatesCache:
+    """Bounded set of state keys (see GameState.get_state_key) that were fully explored
+    by a DFS without finding a solution. Reaching such a state again, we can cut the DFS.
+    Keys are kept in two generations; when the newer one fills up half of max_size,
+    the older one is dropped.
+    """
+
+    def __init__(self, max_size: int = 5_000_000):
+        self.max_size = max_size
+        self._keys_old = set()  # type: Set[bytes]
+        self._keys = set()  # type: Set[bytes]
+        self.num_lookups = 0
+        self.num_hits = 0
+
+    def add(self, key: bytes) -> None:
+        if self.max_size <= 0:
+            return
+        if len(self._keys) >= self.max_size // 2:
+            self._keys_old = self._keys
+            self._keys = set()
+        self._keys.add(key)
+
+    def __contains__(self, key: bytes) -> bool:
+        self.num_lookups += 1
+        if key in self._keys or key in self._keys_old:
+            self.num_hits += 1
+            return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._keys_old)
+
+    def print_diagnostic_data(self) -> None:
+        print(f"- refuted states cache: size={len(self)}. lookups={self.num_lookups}. hits={self.num_hits}")
+
+
+class SearchBudget:
+    """Limits a search to a number of seconds and/or a number of nodes (states visited),
+    and keeps track of the best partial state seen (see GameState.get_progress_score),
+    so that a search stopped early can still report its best effort.
+    Without any limit, only the nodes are counted, so that the search pays (almost) nothing per node.
+    """
+
+    def __init__(self, *, time_budget: Optional[float] = None, node_budget: Optional[int] = None):
+        self.time_budget = time_budget
+        self.node_budget = node_budget
+        self.is_bounded = time_budget is not None or node_budget is not None
+        self.time_start = time.monotonic()
+        self.num_nodes = 0
+        self.best_score = (-1, -1)  # type: Tuple[int, int]
+        self.best_history = TradeHistory()
+        self.is_exhausted = False
+
+    def visit(self, gs: GameState) -> bool:
+        """To be called for each node of the search.
+        Returns whether the budget is exhausted (and so the search should stop).
+        """
+        self.num_nodes += 1
+        if not self.is_bounded:
+            return False
+        score = gs.get_progress_score()
+        if score > self.best_score:
+            self.best_score = score
+            self.best_history = gs.history.copy()
+        if self.node_budget is not None and self.num_nodes >= self.node_budget:
+            self.is_exhausted = True
+        elif self.time_budget is not None and time.monotonic() - self.time_start >= self.time_budget:
+            self.is_exhausted = True
+        return self.is_exhausted
+
+    def print_best_partial_state(self) -> None:
+        """To be called if the search ended without a solution: either the budget ran out,
+        or the search raised "no solution" (it ran out of states to try).
+        """
+        if self.is_exhausted:
+            print(f"search budget exhausted ({self.time_budget=}, {self.node_budget=}). {self.num_nodes=}")
+        else:
+            print(f"no solution: search space exhausted. {self.num_nodes=}")
+        if not self.is_bounded:
+            return  # the best partial state is only tracked with a budget
+        print(f"best partial state (bottom trades done, inventory-value): {self.best_score}")
+        print(f"- history state: {self.best_history.trade_idxs.tolist()}")
+        for idx, action in enumerate(self.best_history):
+            print(f"idx={idx}. action={action}.")
+
+
+def add_budget_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="stop after this many seconds, reporting the best partial state")
+    parser.add_argument("--node-budget", type=int, default=None,
+                        help="stop after visiting this many nodes, reporting the best partial state")
+
+
+def create_search_budget(args: argparse.Namespace) -> SearchBudget:
+    return SearchBudget(time_budget=args.time_budget, node_budget=args.node_budget)
 
 
 #########################
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+#
+# Solver for Hearthstone Barrens Mystery "Hunter Puzzle"
+# MIT License
+# Copyright (c) 2021 Laszlo Makk
+#
+# Portfolio runner: races several solver strategies concurrently (as subprocesses, driven by asyncio),
+# and stops all of them as soon as one of them prints a solution that verify.py accepts.
+# The solvers print "- history state: [...]" (trade indices; script2 prints "- history(N) state: [...]")
+# with their progress, and at the end.
+# The output of each solver is read line by line as it arrives, and every history state is replayed
+# by verify.RulesEngine: the first complete one wins. The verdicts are also printed as progress
+# (at most every --progress-interval seconds per strategy).
+# So the time-to-solution is the best of the strategies (given a core for each of them).
+# A strategy that prints no history state cannot win, so the results table shows how many each printed
+# (with --check-progress, the exit status is 1 if any strategy printed none).
+
+import argparse
+import asyncio
+import os
+import re
+import signal
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import verify
+
+# name -> command line (without the interpreter)
+STRATEGIES = {
+    "script1": ["script1.py"],
+    "script2": ["script2.py"],
+    "script3": ["script3.py"],
+    "script4": ["script4.py"],
+    "script5": ["script5.py"],
+    "script6": ["script6.py"],
+}  # type: Dict[str, Sequence[str]]
+
+HISTORY_LINE_REGEX = re.compile(r"^- history(?:\(\d+\))? state: (\[[\d, ]*\])$")
+
+
+class StrategyResult(NamedTuple):
+    name: str
+    status: str  # "solved", "no solution", "stopped" or "timed out"
+    wall_time: float
+    solution: Optional[Sequence[int]]  # trade indices
+    last_verdict: Optional[verify.Verdict]
+    num_states: int  # number of history states it printed
+    returncode: Optional[int]  # None if it was killed
+
+
+async def run_strategy(name: str, extra_args: Sequence[str], *, time_start: float, show_output: bool,
+                       progress_interval: float, last_verdicts: Dict[str, verify.Verdict],
+                       num_states: Dict[str, int]) -> StrategyResult:
+    """Runs the strategy until it prints a verified complete history, or exits.
+    If cancelled, the strategy (and any worker processes it started) is killed.
+    The verdict of its last history state is kept in last_verdicts[name], their number in num_states[name].
+    """
+    num_states[name] = 0
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-u", *STRATEGIES[name], *extra_args,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        start_new_session=True,  # so that its whole process group can be killed
+        limit=2 ** 20)
+    engine = verify.RulesEngine()
+    last_progress_time = -float("inf")
+    try:
+        async for raw_line in proc.stdout:
+            line = raw_line.decode().rstrip("\n")
+            if show_output:
+                print(f"[{name}] {line}")
+            match = HISTORY_LINE_REGEX.match(line)
+            if match is None:
+                continue
+            num_states[name] += 1
+            verdict = last_verdicts[name] = engine.replay(verify.parse_ints_line(match.group(1)))
+            if verdict.is_complete:
+                solution = [int(idx) for idx in re.findall(r"\d+", match.group(1))]
+                print(f"[{name}] {time.monotonic() - time_start:.1f}s: {verdict.describe()}")
+                return StrategyResult(name, "solved", time.monotonic() - time_start, solution, verdict,
+                                      num_states[name], None)
+            if time.monotonic() - last_progress_time >= progress_interval:
+                last_progress_time = time.monotonic()
+                print(f"[{name}] {last_progress_time - time_start:.1f}s: {verdict.describe()}")
+        await proc.wait()
+    finally:
+        if proc.returncode is None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+    return StrategyResult(name, "no solution", time.monotonic() - time_start, None, last_verdicts.get(name),
+                          num_states[name], proc.returncode)
+
+
+async def race(names: Sequence[str], extra_args: Sequence[str], *, timeout: Optional[float],
+               show_output: bool, progress_interval: float) -> List[StrategyResult]:
+    """Returns the results of all strategies, the winner (if any) first."""
+    time_start = time.monotonic()
+    last_verdicts = {}  # type: Dict[str, verify.Verdict]
+    num_states = {}  # type: Dict[str, int]
+    tasks = {asyncio.create_task(run_strategy(name, extra_args, time_start=time_start, show_output=show_output,
+                                              progress_interval=progress_interval, last_verdicts=last_verdicts,
+                                              num_states=num_states)): name
+             for name in names}
+    results = []  # type: List[StrategyResult]
+    pending = set(tasks)
+    deadline = time_start + timeout if timeout is not None else None
+    while pending:
+        remaining = deadline - time.monotonic() if deadline is not None else None
+        done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            break  # timed out
+        for task in done:
+            results.append(task.result())
+        if any(result.status == "solved" for result in results):
+            break
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    status = "stopped" if any(result.status == "solved" for result in results) else "timed out"
+    for task in pending:
+        results.append(StrategyResult(tasks[task], status, time.monotonic() - time_start, None,
+                                      last_verdicts.get(tasks[task]), num_states.get(tasks[task], 0), None))
+    results.sort(key=lambda result: (result.status != "solved", result.wall_time))
+    return results
+
+
+def print_results_table(results: Sequence[StrategyResult]) -> None:
+    print(f"{'strategy':<12} {'status':<12} {'exit':>4} {'time':>9} {'states':>6}  last history state")
+    for result in results:
+        returncode = result.returncode if result.returncode is not None else "-"
+        last_verdict = result.last_verdict.describe() if result.last_verdict is not None else "-"
+        print(f"{result.name:<12} {result.status:<12} {returncode:>4} {result.wall_time:>8.1f}s {result.num_states:>6}  "
+              f"{last_verdict}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Race solver strategies; stop at the first verified solution.")
+    parser.add_argument("--strategies", default="script3,script1,script2,script4",
+                        help=f"comma separated; available: {', '.join(STRATEGIES)}")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds; stop all strategies after this")
+    parser.add_argument("--progress-interval", type=float, default=30.0,
+                        help="seconds between progress lines of a strategy")
+    parser.add_argument("--show-output", action="store_true", help="also print the output of the strategies")
+    parser.add_argument("--check-progress", action="store_true",
+                        help="exit with status 1 if any strategy printed no history state (e.g. with --timeout 60)")
+    parser.add_argument("extra_args", nargs="*", help="passed to every strategy (after --)")
+    args = parser.parse_args()
+
+    names = args.strategies.split(",")
+    for name in names:
+        if name not in STRATEGIES:
+            parser.error(f"unknown strategy: {name}")
+    print(f"=====")
+    print(f">>> racing {len(names)} strategies: {', '.join(names)}")
+    time_start = time.monotonic()
+    results = asyncio.run(race(names, args.extra_args, timeout=args.timeout, show_output=args.show_output,
+                               progress_interval=args.progress_interval))
+    print(f"=====")
+    print_results_table(results)
+    no_progress = [result.name for result in results if result.num_states == 0]
+    if no_progress:
+        print(f"- no history state seen from: {', '.join(no_progress)}")
+    winner = results[0] if results and results[0].status == "solved" else None
+    if winner is None:
+        print(f"no strategy found a solution.")
+    else:
+        print(f"- winner: {winner.name}. time to solution: {winner.wall_time:.3f} seconds.")
+        print(f"- history state: {list(winner.solution)}")
+        print(f"DONE!")
+    print(f"Total time taken: {time.monotonic() - time_start:.3f} seconds.")
+    if args.check_progress and no_progress:
+        sys.exit(1)
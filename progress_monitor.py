@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+#
+# Solver for Hearthstone Barrens Mystery "Hunter Puzzle"
+# MIT License
+# Copyright (c) 2021 Laszlo Makk
+#
+# Polls the live progress endpoints of running solvers (see hsprogress.py),
+# and prints them as one table. Processes of the same parallel run (e.g. the workers
+# of sweep2.py) share a group, and get a merged summary line.
+# An endpoint is one of
+# - a port number or an http:// URL (--progress-port of a solver),
+# - a Unix socket path (--progress-socket of a solver),
+# - a directory: all the *.sock files in it.
+# Once a solver serving on a Unix socket finished, its final snapshot is read from the file
+# it wrote next to the socket (<script>.<pid>.json, see hsprogress.get_final_snapshot_path),
+# so finished solvers keep showing up with their final status.
+
+import argparse
+import collections
+import glob
+import json
+import os
+import socket
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional, Sequence
+
+
+def expand_endpoints(endpoints: Sequence[str]) -> List[str]:
+    expanded = []
+    for endpoint in endpoints:
+        if endpoint.isdigit():
+            expanded.append(f"http://127.0.0.1:{endpoint}/")
+        elif os.path.isdir(endpoint):
+            socket_paths = glob.glob(os.path.join(endpoint, "*.sock"))
+            final_paths = {get_final_snapshot_path(socket_path) for socket_path in socket_paths}
+            expanded.extend(sorted(socket_paths + [final_path for final_path in glob.glob(os.path.join(endpoint, "*.json"))
+                                                   if final_path not in final_paths]))
+        else:
+            expanded.append(endpoint)
+    return expanded
+
+
+def get_final_snapshot_path(socket_path: str) -> str:
+    # as hsprogress.get_final_snapshot_path (not imported, as hsutil prints its derivations when imported)
+    return os.path.splitext(socket_path)[0] + ".json"
+
+
+def poll(endpoint: str, *, timeout: float = 2.0) -> Optional[Dict[str, Any]]:
+    """Returns the progress snapshot served at endpoint (or the final one written by a finished solver),
+    or None if it is not reachable.
+    """
+    try:
+        if endpoint.endswith(".json"):
+            with open(endpoint, "rb") as f:
+                return json.loads(f.read())
+        if endpoint.startswith("http://"):
+            with urllib.request.urlopen(endpoint, timeout=timeout) as response:
+                return json.loads(response.read())
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(endpoint)
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            return json.loads(b"".join(chunks))
+    except (OSError, ValueError):
+        pass
+    if not endpoint.startswith("http://") and not endpoint.endswith(".json") \
+            and os.path.exists(get_final_snapshot_path(endpoint)):
+        return poll(get_final_snapshot_path(endpoint))  # the solver finished
+    return None  # the solver exited (or is not up yet)
+
+
+def format_hit_rate(snapshot: Dict[str, Any]) -> str:
+    if not snapshot.get("cache_lookups"):
+        return "-"
+    return f"{100 * snapshot['cache_hits'] / snapshot['cache_lookups']:.1f}%"
+
+
+def print_table(snapshots: Sequence[Dict[str, Any]]) -> None:
+    print(f"{'script':<12} {'pid':>7} {'run':<22} {'status':<16} {'elapsed':>9} {'nodes':>11} {'nodes/s':>8} "
+          f"{'depth':>5} {'bl':>3} {'best score':>10} {'hit rate':>8}")
+    groups = collections.defaultdict(list)  # type: Dict[int, List[Dict[str, Any]]]
+    for snapshot in snapshots:
+        groups[snapshot["group"]].append(snapshot)
+    for group, members in sorted(groups.items()):
+        # the process that started the group (if it reports) comes first, then its workers
+        members.sort(key=lambda snapshot: (snapshot["pid"] != group, snapshot.get("run", "")))
+        for snapshot in members:
+            best_score = tuple(snapshot["best_score"]) if "best_score" in snapshot else "-"
+            print(f"{snapshot['script']:<12} {snapshot['pid']:>7} {snapshot.get('run', ''):<22} "
+                  f"{snapshot['status']:<16} {snapshot['elapsed']:>8.0f}s {snapshot.get('nodes', '-'):>11} "
+                  f"{snapshot.get('nodes_per_sec', '-'):>8} {snapshot.get('depth', '-'):>5} "
+                  f"{snapshot.get('bottom_trades_done', '-'):>3} {str(best_score):>10} {format_hit_rate(snapshot):>8}")
+        workers = [snapshot for snapshot in members if "nodes" in snapshot]
+        if len(workers) > 1:
+            running = [snapshot for snapshot in workers if snapshot["status"] == "running"]
+            best_score = max((tuple(snapshot["best_score"]) for snapshot in workers if "best_score" in snapshot),
+                             default=(0, 0))
+            print(f"{'':<12} {'':>7} {f'= group of {len(workers)}':<22} {f'{len(running)} running':<16} {'':>9} "
+                  f"{sum(snapshot['nodes'] for snapshot in workers):>11} "
+                  f"{sum(snapshot['nodes_per_sec'] for snapshot in running):>8} {'':>5} "
+                  f"{best_score[0]:>3} {str(best_score):>10}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Show the live progress of running solvers.")
+    parser.add_argument("endpoints", nargs="+", help="ports, http:// URLs, Unix socket paths or directories of them")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between polls")
+    parser.add_argument("--once", action="store_true", help="poll once and exit")
+    args = parser.parse_args()
+
+    while True:
+        snapshots = []
+        for endpoint in expand_endpoints(args.endpoints):
+            snapshot = poll(endpoint)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+        print(f"=====")
+        print(f"{time.strftime('%H:%M:%S')}. solvers reachable: {len(snapshots)}")
+        print_table(snapshots)
+        if args.once:
+            break
+        time.sleep(args.interval)
@@ -23,44 +23,73 @@
 #        - a state is: hash((bottomlinetrades_done, inventory))
 #          - a 16 byte hash might be long enough... e.g. sha256(x)[:16]
 
-import sys
+import argparse
 import time
 
+import hsbounds
+import hsprofile
+import hsprogress
 import hsutil
 from hsutil import ALL_GOOD_TRADES
 from hsutil import GameState
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="DFS solver, each edge is a single trade.")
+    # allow specifying where to start searching for first move:
+    parser.add_argument("start_trade_idx", type=int, nargs="?", default=0,
+                        help="index (in ALL_GOOD_TRADES) of the first move to try")
+    hsutil.add_budget_args(parser)
+    hsbounds.add_bounds_args(parser)
+    hsprofile.add_profile_args(parser)
+    hsprogress.add_progress_args(parser)
+    args = parser.parse_args()
+
     # main code starts.
     print(f"=====")
     print(f">>> main code starts...")
     gs = GameState()
-    trade_idx = 0  # next action to try
+    bounds = hsbounds.attach_bounds(gs, args.bounds, atomic_chaincraft=False)
+    trade_idx = args.start_trade_idx  # next action to try
     iter_count = 0
     time_start = time.monotonic()
+    budget = hsutil.create_search_budget(args)
+    profiler = hsprofile.Profiler(args)
+    profiler.start()
+    progress = hsprogress.create_progress_reporter(args)
 
-    # allow specifying where to start searching for first move:
-    if len(sys.argv) > 1:
-        trade_idx = int(sys.argv[1])
-
-    while not gs.is_complete():
-        iter_count += 1
-        if iter_count % 100_000 == 0:
-            print(f"-----")
-            print(f"iters done: {iter_count//1000} k")
-            gs.print_diagnostic_data()
-            print(f"Time taken: {time.monotonic() - time_start:.3f} seconds.")
-
-        for trade in ALL_GOOD_TRADES[trade_idx:]:
-            if gs.do_trade(trade):
-                trade_idx = 0
+    try:
+        while not gs.is_complete():
+            if budget.visit(gs):
                 break
-        else:
-            trade_idx = gs.undo_last_trade() + 1
+            iter_count += 1
+            if iter_count % 100_000 == 0:
+                print(f"-----")
+                print(f"iters done: {iter_count//1000} k")
+                gs.print_diagnostic_data()
+                print(f"Time taken: {time.monotonic() - time_start:.3f} seconds.")
+            if iter_count % 10_000 == 0:
+                progress.update_from_search(gs, budget)
 
+            for trade in ALL_GOOD_TRADES[trade_idx:]:
+                if gs.do_trade(trade):
+                    trade_idx = 0
+                    break
+            else:
+                trade_idx = gs.undo_last_trade() + 1
+    except Exception as e:
+        if str(e) != "no solution":
+            raise
+    finally:
+        profiler.stop()
+        progress.finish_search(gs, budget)
     print(f"=====")
-    gs.print_diagnostic_data()
-    print(f"DONE!")
-    print(f"Total time taken: {time.monotonic()-time_start:.3f} seconds.")
-    gs.print_readable_history()
+    hsbounds.print_bounds_report(bounds)
+    if not gs.is_complete():
+        budget.print_best_partial_state()
+        print(f"Total time taken: {time.monotonic()-time_start:.3f} seconds.")
+    else:
+        gs.print_diagnostic_data()
+        print(f"DONE!")
+        print(f"Total time taken: {time.monotonic()-time_start:.3f} seconds.")
+        gs.print_readable_history()
@@ -6,92 +6,182 @@
 #
 # Greedy approach.
 # Look ahead k steps (depth=k), choose next step towards best state seen.
+# (see sweep2.py for trying many heuristic/depth combinations)
 
-import sys
+import argparse
 import time
-from typing import Tuple, Sequence, Type, Optional
+import random
+from typing import Callable, Dict, Tuple, Sequence, Type, Optional
 
+import hsprofile
+import hsprogress
 import hsutil
 from hsutil import ALL_GOOD_TRADES
+from hsutil import ALL_TRADES_ANY
 from hsutil import BOTTOM_LINE_TRADES
 from hsutil import GameState
+from hsutil import SearchBudget
 from hsutil import Trade
+from hsprogress import ProgressReporter
 
 SCORING_HEURISTIC = 1
 LOOKAHEAD_DEPTH = 15
 
-if SCORING_HEURISTIC == 1:
-    def score_gamestate(gs: GameState) -> Sequence[int]:
-        num_bottomtradesdone = bin(gs.bottomlinetrades_done)[2:].count("1")
-        return num_bottomtradesdone, gs.cur_inventory_goldvalue
-elif SCORING_HEURISTIC == 2:
-    def score_gamestate(gs: GameState) -> Sequence[int]:
-        bltrades_done = hsutil.list_enabled_bits(gs.bottomlinetrades_done)
-        positive_bltrades_done = [
-            idx for idx in bltrades_done
-            if BOTTOM_LINE_TRADES[idx].delta_balance() > 0]
-        return len(positive_bltrades_done), len(bltrades_done), gs.cur_inventory_goldvalue
-elif SCORING_HEURISTIC == 3:
-    def score_gamestate(gs: GameState) -> Sequence[int]:
-        bltrades_done = hsutil.list_enabled_bits(gs.bottomlinetrades_done)
-        total_gold_collected = sum([
-            BOTTOM_LINE_TRADES[idx].delta_balance() for idx in bltrades_done
-            if BOTTOM_LINE_TRADES[idx].delta_balance() > 0])
-        return total_gold_collected, len(bltrades_done), gs.cur_inventory_goldvalue, -gs.get_cur_inventory_num_itemtypes_excl_gold()
-elif SCORING_HEURISTIC == 4:
-    def score_gamestate(gs: GameState) -> Sequence[int]:
-        num_bottomtradesdone = bin(gs.bottomlinetrades_done)[2:].count("1")
-        return num_bottomtradesdone, -gs.get_cur_inventory_num_itemtypes_excl_gold(), gs.cur_inventory_goldvalue
 
+def score_gamestate_1(gs: GameState) -> Sequence[int]:
+    num_bottomtradesdone = bin(gs.bottomlinetrades_done)[2:].count("1")
+    return num_bottomtradesdone, gs.cur_inventory_goldvalue
 
-if __name__ == '__main__':
-    # main code starts.
-    print(f"=====")
-    print(f">>> main code starts...")
-    gs = GameState()
-    time_start = time.monotonic()
 
-    # XXXXX testing
-    # gs.do_trade(hsutil.TradeTop61)
+def score_gamestate_2(gs: GameState) -> Sequence[int]:
+    bltrades_done = hsutil.list_enabled_bits(gs.bottomlinetrades_done)
+    positive_bltrades_done = [
+        idx for idx in bltrades_done
+        if BOTTOM_LINE_TRADES[idx].delta_balance() > 0]
+    return len(positive_bltrades_done), len(bltrades_done), gs.cur_inventory_goldvalue
+
+
+def score_gamestate_3(gs: GameState) -> Sequence[int]:
+    bltrades_done = hsutil.list_enabled_bits(gs.bottomlinetrades_done)
+    total_gold_collected = sum([
+        BOTTOM_LINE_TRADES[idx].delta_balance() for idx in bltrades_done
+        if BOTTOM_LINE_TRADES[idx].delta_balance() > 0])
+    return total_gold_collected, len(bltrades_done), gs.cur_inventory_goldvalue, -gs.get_cur_inventory_num_itemtypes_excl_gold()
+
+
+def score_gamestate_4(gs: GameState) -> Sequence[int]:
+    num_bottomtradesdone = bin(gs.bottomlinetrades_done)[2:].count("1")
+    return num_bottomtradesdone, -gs.get_cur_inventory_num_itemtypes_excl_gold(), gs.cur_inventory_goldvalue
+
+
+SCORING_HEURISTICS = {
+    1: score_gamestate_1,
+    2: score_gamestate_2,
+    3: score_gamestate_3,
+    4: score_gamestate_4,
+}  # type: Dict[int, Callable[[GameState], Sequence[int]]]
+
+# name -> order in which the lookahead tries the trades (a permutation of ALL_GOOD_TRADES).
+# The order decides which of the equally scored states is kept, so it changes the path taken.
+TRADE_ORDERINGS = {
+    "default": ALL_GOOD_TRADES,
+    "reversed": tuple(reversed(ALL_GOOD_TRADES)),
+    "toplinefirst": tuple(sorted(ALL_GOOD_TRADES, key=lambda trade: trade in BOTTOM_LINE_TRADES)),
+    "deltabalance": tuple(sorted(ALL_GOOD_TRADES, key=lambda trade: trade.delta_balance(), reverse=True)),
+}  # type: Dict[str, Sequence[Type[Trade]]]
+
 
+def get_trade_ordering(name: str) -> Sequence[Type[Trade]]:
+    """Returns TRADE_ORDERINGS[name], or a shuffled ALL_GOOD_TRADES for "random:SEED"."""
+    if name.startswith("random:"):
+        trade_order = list(ALL_GOOD_TRADES)
+        random.Random(int(name[len("random:"):])).shuffle(trade_order)
+        return tuple(trade_order)
+    if name not in TRADE_ORDERINGS:
+        raise ValueError(f"unknown trade ordering: {name!r}")
+    return TRADE_ORDERINGS[name]
+
+
+def run_greedy(gs: GameState, *, scoring_heuristic: int, lookahead_depth: int, budget: SearchBudget,
+               trade_order: Sequence[Type[Trade]] = ALL_GOOD_TRADES,
+               progress: Optional[ProgressReporter] = None, verbose: bool = True) -> None:
+    """Greedily executes trades until gs is complete (or the budget is exhausted).
+    The lookahead tries the trades in trade_order (a permutation of ALL_GOOD_TRADES).
+    Raises "no solution" if it gets stuck.
+    """
+    score_gamestate = SCORING_HEURISTICS[scoring_heuristic]
+    assert sorted(map(ALL_TRADES_ANY.index, trade_order)) == list(range(len(ALL_GOOD_TRADES)))
+    # index in ALL_TRADES_ANY (as returned by undo_last_trade) -> position in trade_order
+    trade_pos = {ALL_TRADES_ANY.index(trade): pos for pos, trade in enumerate(trade_order)}  # type: Dict[int, int]
     while not gs.is_complete():
-        print(f"-----")
-        print(f"OUTER LOOP iter. ({LOOKAHEAD_DEPTH=}, {SCORING_HEURISTIC=})")
-        print(f"- history({len(gs.history)}) state: {gs.dump_history_trade_idx_ints()}")
-        if gs.history:
-            print(f"- last trade: {gs.history[-1]}")
-        print(f"Time taken: {time.monotonic() - time_start:.3f} seconds.")
+        if verbose:
+            print(f"-----")
+            print(f"OUTER LOOP iter. ({lookahead_depth=}, {scoring_heuristic=})")
+            print(f"- history({len(gs.history)}) state: {gs.dump_history_trade_idx_ints()}")
+            if gs.history:
+                print(f"- last trade: {gs.history[-1]}")
+            print(f"Time taken: {time.monotonic() - budget.time_start:.3f} seconds.")
         greedy_steps_done = len(gs.history)
+        if progress is not None:
+            progress.update_from_search(gs, budget, greedy_steps_done=greedy_steps_done)
         best_score = (0, )  # type: Sequence[int]
         best_trade = None  # type: Optional[Type[Trade]]
-        trade_idx = 0  # next action to try
+        trade_idx = 0  # position in trade_order of the next action to try
         while not gs.is_complete():
+            if budget.visit(gs):
+                break
+            if progress is not None and budget.num_nodes % 10_000 == 0:
+                progress.update_from_search(gs, budget, greedy_steps_done=greedy_steps_done)
             # print(f"INNER LOOP iter.")
             # print(f"- history state: {gs.dump_history_trade_idx_ints()}")
-            if len(gs.history) == greedy_steps_done + LOOKAHEAD_DEPTH:
+            if len(gs.history) == greedy_steps_done + lookahead_depth:
                 score = score_gamestate(gs)
                 if score > best_score:
                     best_score = score
                     best_trade = gs.history[greedy_steps_done][0]
-                trade_idx = gs.undo_last_trade() + 1
-            for trade in ALL_GOOD_TRADES[trade_idx:]:
+                trade_idx = trade_pos[gs.undo_last_trade()] + 1
+            for trade in trade_order[trade_idx:]:
                 if gs.do_trade(trade):
                     trade_idx = 0
                     break
             else:
                 if len(gs.history) == greedy_steps_done:
                     break
-                trade_idx = gs.undo_last_trade() + 1
+                trade_idx = trade_pos[gs.undo_last_trade()] + 1
 
-        if gs.is_complete():
+        if gs.is_complete() or budget.is_exhausted:
             break
         assert len(gs.history) == greedy_steps_done
         if best_trade is None:
             raise Exception("no solution")
         gs.do_trade(best_trade)
 
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Greedy solver with lookahead.")
+    parser.add_argument("--heuristic", type=int, choices=sorted(SCORING_HEURISTICS), default=SCORING_HEURISTIC,
+                        help="scoring heuristic for the states seen during lookahead")
+    parser.add_argument("--depth", type=int, default=LOOKAHEAD_DEPTH, help="lookahead depth")
+    parser.add_argument("--ordering", default="default",
+                        help=f"order in which the lookahead tries the trades: {', '.join(TRADE_ORDERINGS)} or random:SEED")
+    hsutil.add_budget_args(parser)
+    hsprofile.add_profile_args(parser)
+    hsprogress.add_progress_args(parser)
+    args = parser.parse_args()
+    try:
+        trade_order = get_trade_ordering(args.ordering)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # main code starts.
+    print(f"=====")
+    print(f">>> main code starts...")
+    gs = GameState()
+    time_start = time.monotonic()
+    budget = hsutil.create_search_budget(args)
+    profiler = hsprofile.Profiler(args)
+    profiler.start()
+    progress = hsprogress.create_progress_reporter(args)
+
+    # XXXXX testing
+    # gs.do_trade(hsutil.TradeTop61)
+
+    try:
+        run_greedy(gs, scoring_heuristic=args.heuristic, lookahead_depth=args.depth, budget=budget,
+                   trade_order=trade_order, progress=progress)
+    except Exception as e:
+        if str(e) != "no solution":
+            raise
+    finally:
+        profiler.stop()
+        progress.finish_search(gs, budget)
+
     print(f"=====")
-    gs.print_diagnostic_data()
-    print(f"DONE!")
-    print(f"Total time taken: {time.monotonic()-time_start:.3f} seconds.")
-    gs.print_readable_history()
+    if not gs.is_complete():
+        budget.print_best_partial_state()
+        print(f"Total time taken: {time.monotonic()-time_start:.3f} seconds.")
+    else:
+        gs.print_diagnostic_data()
+        print(f"DONE!")
+        print(f"Total time taken: {time.monotonic()-time_start:.3f} seconds.")
+        gs.print_readable_history()
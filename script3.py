@@ -8,40 +8,72 @@
 # Each edge is a full craft-sequence required for, and including, a bottom-line trade.
 # Heuristic: craft sequences for bottom-line trades are atomic.
 
-import sys
+import argparse
 import time
 
+import hsbounds
+import hsprofile
+import hsprogress
 import hsutil
 from hsutil import BOTTOM_LINE_TRADES
 from hsutil import GameState
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="DFS solver, each edge is a full craft-sequence for a bottom-line trade.")
+    hsutil.add_budget_args(parser)
+    parser.add_argument("--chaincraft-cache-size", type=int, default=0,
+                        help="max number of chaincraft plans cached (see hsutil.ChaincraftPlan); 0 disables")
+    hsbounds.add_bounds_args(parser)
+    hsprofile.add_profile_args(parser)
+    hsprogress.add_progress_args(parser)
+    args = parser.parse_args()
+
     # main code starts.
     print(f"=====")
     print(f">>> main code starts...")
-    gs = GameState()
+    gs = GameState(chaincraft_cache_size=args.chaincraft_cache_size)
+    bounds = hsbounds.attach_bounds(gs, args.bounds, atomic_chaincraft=True)
     trade_idx = 0  # next action to try
     iter_count = 0
     time_start = time.monotonic()
+    budget = hsutil.create_search_budget(args)
+    profiler = hsprofile.Profiler(args)
+    profiler.start()
+    progress = hsprogress.create_progress_reporter(args)
 
-    while not gs.is_complete():
-        iter_count += 1
-        if iter_count % 100_000 == 0:
-            print(f"-----")
-            print(f"iters done: {iter_count//1000} k")
-            gs.print_diagnostic_data()
-            print(f"Time taken: {time.monotonic() - time_start:.3f} seconds.")
-
-        for trade in BOTTOM_LINE_TRADES[trade_idx:]:
-            if gs.chaincraft_bltrade(trade):
-                trade_idx = 0
+    try:
+        while not gs.is_complete():
+            if budget.visit(gs):
                 break
-        else:
-            trade_idx = gs.undo_last_chaincraft() + 1
+            iter_count += 1
+            if iter_count % 100_000 == 0:
+                print(f"-----")
+                print(f"iters done: {iter_count//1000} k")
+                gs.print_diagnostic_data()
+                print(f"Time taken: {time.monotonic() - time_start:.3f} seconds.")
+            if iter_count % 10_000 == 0:
+                progress.update_from_search(gs, budget)
 
+            for trade in BOTTOM_LINE_TRADES[trade_idx:]:
+                if gs.chaincraft_bltrade(trade):
+                    trade_idx = 0
+                    break
+            else:
+                trade_idx = gs.undo_last_chaincraft() + 1
+    except Exception as e:
+        if str(e) != "no solution":
+            raise
+    finally:
+        profiler.stop()
+        progress.finish_search(gs, budget)
     print(f"=====")
-    gs.print_diagnostic_data()
-    print(f"DONE!")
-    print(f"Total time taken: {time.monotonic()-time_start:.3f} seconds.")
-    gs.print_readable_history()
+    hsbounds.print_bounds_report(bounds)
+    if not gs.is_complete():
+        budget.print_best_partial_state()
+        print(f"Total time taken: {time.monotonic()-time_start:.3f} seconds.")
+    else:
+        gs.print_diagnostic_data()
+        print(f"DONE!")
+        print(f"Total time taken: {time.monotonic()-time_start:.3f} seconds.")
+        gs.print_readable_history()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+#
+# Solver for Hearthstone Barrens Mystery "Hunter Puzzle"
+# MIT License
+# Copyright (c) 2021 Laszlo Makk
+#
+# Depth-first search, with some of the conjectured observations (4, 5, 7) lifted.
+# - by default (observation 7 assumed), each edge is a full craft-sequence required for,
+#   and including, a bottom-line trade (as in script3)
+#   - without observation 4, each edge is a (bottom-line trade, craft-sequence) pair,
+#     where the craft-sequence might contain bad top-line trades
+# - with --relax-obs7, each edge is a trade, either top-line or bottom-line (as in script1),
+#   so crafts for different bottom-line trades can be interleaved
+# Extra bounding:
+# - value lost via bad top-line trades is at most STARTING_GOLD (the final inventory-value is non-negative)
+# - the value of items no remaining bottom-line trade can use ("dead items") must fit into
+#   the final inventory (i.e. it is zero with observation 5); see hsbounds.DeadItemsBound
+# - items_crafted_ever is capped (see hsutil.get_items_crafted_cap)
+# - optionally, further bounds from hsbounds (--bounds)
+# Caching:
+# - states (bottom-line trades done, inventory) that were fully explored are remembered,
+#   and the DFS is cut when reaching them again (see script1 "idea1").
+
+import argparse
+import time
+from typing import Sequence
+
+import hsbounds
+import hscache
+import hsprofile
+import hsprogress
+import hsutil
+from hsutil import ALL_GOOD_TRADES, ALL_TRADES_ANY
+from hsutil import BOTTOM_LINE_TRADES
+from hsutil import CRAFTING_TRADECHAINS_FOR_TRADE_ANY
+from hsutil import GameState
+from hsutil import RefutedStatesCache
+from hsutil import SearchBudget
+from hscache import PersistentRefutedStatesCache
+from hsprogress import ProgressReporter
+
+
+def is_state_refuted(gs: GameState, refuted_states: RefutedStatesCache) -> bool:
+    return gs.get_state_key() in refuted_states
+
+
+def replay_solution(gs: GameState, trade_idxs: Sequence[int]) -> None:
+    """Replays a solution from the persistent cache. If it does not apply, gs is reset."""
+    for trade_idx in trade_idxs:
+        if not gs.do_trade(ALL_TRADES_ANY[trade_idx]):
+            print(f"WARNING: cached solution does not apply, ignoring it.")
+            while gs.history:
+                gs.undo_last_trade()
+            return
+
+
+def print_progress(gs: GameState, refuted_states: RefutedStatesCache, iter_count: int, time_start: float) -> None:
+    print(f"-----")
+    print(f"iters done: {iter_count//1000} k")
+    gs.print_diagnostic_data()
+    refuted_states.print_diagnostic_data()
+    print(f"Time taken: {time.monotonic() - time_start:.3f} seconds.")
+
+
+def search_chaincraft(gs: GameState, refuted_states: RefutedStatesCache, budget: SearchBudget,
+                      progress: ProgressReporter, time_start: float) -> None:
+    moves = []
+    for trade in BOTTOM_LINE_TRADES:
+        moves.append((trade, None))  # optimal craft-sequence
+        if gs.allow_bad_trades:
+            moves.extend((trade, tradechain) for tradechain in CRAFTING_TRADECHAINS_FOR_TRADE_ANY[trade][1:])
+    print(f"number of different edges: {len(moves)}")
+    move_idx_stack = []
+    move_idx = 0  # next action to try
+    iter_count = 0
+    while not gs.is_complete():
+        if budget.visit(gs):
+            return
+        iter_count += 1
+        if iter_count % 100_000 == 0:
+            print_progress(gs, refuted_states, iter_count, time_start)
+            if isinstance(refuted_states, PersistentRefutedStatesCache):
+                refuted_states.refresh()  # pick up what concurrent runs refuted
+        if iter_count % 10_000 == 0:
+            progress.update_from_search(gs, budget, cache_lookups=refuted_states.num_lookups,
+                                        cache_hits=refuted_states.num_hits)
+
+        for idx in range(move_idx, len(moves)):
+            trade, tradechain = moves[idx]
+            if gs.chaincraft_bltrade(trade, tradechain):
+                if is_state_refuted(gs, refuted_states):
+                    gs.undo_last_chaincraft()
+                    continue
+                move_idx_stack.append(idx)
+                move_idx = 0
+                break
+        else:
+            if not move_idx_stack:
+                raise Exception("no solution")
+            refuted_states.add(gs.get_state_key())
+            gs.undo_last_chaincraft()
+            move_idx = move_idx_stack.pop() + 1
+
+
+def search_singletrade(gs: GameState, refuted_states: RefutedStatesCache, budget: SearchBudget,
+                       progress: ProgressReporter, time_start: float) -> None:
+    # note: ALL_GOOD_TRADES is a prefix of ALL_TRADES_ANY, so trade indices match
+    trades = ALL_TRADES_ANY if gs.allow_bad_trades else ALL_GOOD_TRADES
+    print(f"number of different edges: {len(trades)}")
+    trade_idx = 0  # next action to try
+    iter_count = 0
+    while not gs.is_complete():
+        if budget.visit(gs):
+            return
+        iter_count += 1
+        if iter_count % 100_000 == 0:
+            print_progress(gs, refuted_states, iter_count, time_start)
+            if isinstance(refuted_states, PersistentRefutedStatesCache):
+                refuted_states.refresh()  # pick up what concurrent runs refuted
+        if iter_count % 10_000 == 0:
+            progress.update_from_search(gs, budget, cache_lookups=refuted_states.num_lookups,
+                                        cache_hits=refuted_states.num_hits)
+
+        for trade in trades[trade_idx:]:
+            if gs.do_trade(trade):
+                if is_state_refuted(gs, refuted_states):
+                    gs.undo_last_trade()
+                    continue
+                trade_idx = 0
+                break
+        else:
+            refuted_states.add(gs.get_state_key())
+            trade_idx = gs.undo_last_trade() + 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="DFS solver with some of the conjectured observations lifted.")
+    parser.add_argument("--relax-obs4", action="store_true",
+                        help="allow bad (negative balance delta) top-line trades. implies --relax-obs5")
+    parser.add_argument("--relax-obs5", action="store_true",
+                        help="allow the final inventory to contain items other than GOLD")
+    parser.add_argument("--relax-obs7", action="store_true",
+                        help="allow interleaving crafts for different bottom-line trades")
+    parser.add_argument("--cache-size", type=int, default=5_000_000,
+                        help="max number of refuted states to remember (0 to disable)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="directory of a persistent cache of refuted states and solutions, "
+                             "shared by runs with the same assumptions (see hscache.py)")
+    hsutil.add_budget_args(parser)
+    hsbounds.add_bounds_args(parser, default="dead_items")
+    hsprofile.add_profile_args(parser)
+    hsprogress.add_progress_args(parser)
+    args = parser.parse_args()
+
+    # main code starts.
+    print(f"=====")
+    print(f">>> main code starts... ({args.relax_obs4=}, {args.relax_obs5=}, {args.relax_obs7=})")
+    gs = GameState(allow_bad_trades=args.relax_obs4, allow_leftover_items=args.relax_obs5)
+    bounds = hsbounds.attach_bounds(gs, args.bounds, atomic_chaincraft=not args.relax_obs7)
+    cache = None
+    known_solution = None
+    if args.cache_dir is not None:
+        cache = hscache.PersistentCache(args.cache_dir, hscache.get_puzzle_fingerprint(
+            allow_bad_trades=gs.allow_bad_trades, allow_leftover_items=gs.allow_leftover_items,
+            atomic_chaincraft=not args.relax_obs7, bounds=sorted(bound.NAME for bound in bounds)))
+        refuted_states = cache.open_refuted_states(gs, max_size=args.cache_size)
+        known_solution = cache.load_solution()
+        print(f"persistent cache: {cache.fingerprint=}. {refuted_states.num_loaded} refuted states loaded. "
+              f"solution known: {known_solution is not None}")
+    else:
+        refuted_states = RefutedStatesCache(max_size=args.cache_size)
+    time_start = time.monotonic()
+    budget = hsutil.create_search_budget(args)
+    profiler = hsprofile.Profiler(args)
+    profiler.start()
+    progress = hsprogress.create_progress_reporter(args)
+
+    try:
+        if known_solution is not None:
+            replay_solution(gs, known_solution)
+        if gs.is_complete():
+            print(f"solution loaded from the persistent cache.")
+        elif args.relax_obs7:
+            search_singletrade(gs, refuted_states, budget, progress, time_start)
+        else:
+            search_chaincraft(gs, refuted_states, budget, progress, time_start)
+    except Exception as e:
+        if str(e) != "no solution":
+            raise
+    finally:
+        if cache is not None:
+            refuted_states.close()
+            if gs.is_complete() and known_solution is None:
+                cache.store_solution(gs)
+        profiler.stop()
+        progress.finish_search(gs, budget, cache_lookups=refuted_states.num_lookups,
+                               cache_hits=refuted_states.num_hits)
+    print(f"=====")
+    hsbounds.print_bounds_report(bounds)
+    if not gs.is_complete():
+        refuted_states.print_diagnostic_data()
+        budget.print_best_partial_state()
+        print(f"Total time taken: {time.monotonic()-time_start:.3f} seconds.")
+    else:
+        gs.print_diagnostic_data()
+        refuted_states.print_diagnostic_data()
+        print(f"DONE!")
+        print(f"Total time taken: {time.monotonic()-time_start:.3f} seconds.")
+        gs.print_readable_history()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+#
+# Solver for Hearthstone Barrens Mystery "Hunter Puzzle"
+# MIT License
+# Copyright (c) 2021 Laszlo Makk
+#
+# Monte Carlo tree search.
+# Each edge is either a full craft-sequence required for, and including, a bottom-line trade
+# (--moves chaincraft, as in script3), or a single trade (--moves single, as in script1).
+# - selection: UCT, from the root down to a node that still has untried moves
+# - expansion: one untried move
+# - simulation: random (or heuristic-guided) moves until no move is possible
+# - backpropagation: the reward of a rollout is based on the bottom-line trades done,
+#   and the inventory-value, at the end of the rollout
+# Rollouts of a batch of leaves are run in a process pool, the statistics are merged
+# in the main process. Until the rollouts of a batch return, a "virtual loss" is applied
+# to the selected paths so that the leaves of a batch differ.
+
+import argparse
+import math
+import multiprocessing
+import random
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import hsprofile
+import hsprogress
+import hsutil
+from hsutil import ALL_GOOD_TRADES
+from hsutil import BOTTOM_LINE_TRADES
+from hsutil import GameState
+
+MAX_INVENTORY_GOLDVALUE = hsutil.STARTING_GOLD + sum(trade.delta_balance() for trade in BOTTOM_LINE_TRADES
+                                                    if trade.delta_balance() > 0)
+
+
+class MoveSet:
+    """Moves (edges) of the search tree, identified by their index."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.num_moves = len(BOTTOM_LINE_TRADES) if kind == "chaincraft" else len(ALL_GOOD_TRADES)
+
+    def do_move(self, gs: GameState, move: int) -> bool:
+        if self.kind == "chaincraft":
+            return gs.chaincraft_bltrade(BOTTOM_LINE_TRADES[move])
+        return gs.do_trade(ALL_GOOD_TRADES[move])
+
+    def undo_move(self, gs: GameState) -> None:
+        if self.kind == "chaincraft":
+            gs.undo_last_chaincraft()
+        else:
+            gs.undo_last_trade()
+
+    def delta_balance(self, move: int) -> int:
+        if self.kind == "chaincraft":
+            return BOTTOM_LINE_TRADES[move].delta_balance()
+        return ALL_GOOD_TRADES[move].delta_balance()
+
+    def list_legal_moves(self, gs: GameState) -> List[int]:
+        legal_moves = []
+        for move in range(self.num_moves):
+            if self.do_move(gs, move):
+                self.undo_move(gs)
+                legal_moves.append(move)
+        return legal_moves
+
+
+def get_reward(gs: GameState) -> float:
+    """Maps the score of a state into [0, 1]."""
+    num_bottomtradesdone, goldvalue = gs.get_progress_score()
+    return (num_bottomtradesdone + goldvalue / (MAX_INVENTORY_GOLDVALUE + 1)) / (len(BOTTOM_LINE_TRADES) + 1)
+
+
+class Node:
+    __slots__ = ("untried_moves", "children", "visits", "total_reward")
+
+    def __init__(self, legal_moves: List[int]):
+        self.untried_moves = legal_moves
+        self.children = {}  # type: Dict[int, Node]
+        self.visits = 0
+        self.total_reward = 0.0
+
+    def select_child(self, exploration: float) -> Tuple[int, 'Node']:
+        log_visits = math.log(self.visits)
+        return max(self.children.items(),
+                   key=lambda item: (item[1].total_reward / item[1].visits
+                                     + exploration * math.sqrt(log_visits / item[1].visits)))
+
+
+#########################
+# rollouts (these run in the worker processes)
+
+_worker_moveset = None  # type: Optional[MoveSet]
+_worker_rollout_policy = None  # type: Optional[str]
+
+
+def _init_worker(moves_kind: str, rollout_policy: str, seed: int) -> None:
+    global _worker_moveset, _worker_rollout_policy
+    _worker_moveset = MoveSet(moves_kind)
+    _worker_rollout_policy = rollout_policy
+    random.seed(seed + (multiprocessing.current_process()._identity or (0,))[0])
+
+
+def rollout(path: Sequence[int]) -> Tuple[float, Tuple[int, int], Sequence[int]]:
+    """Replays path from the starting state, then does a rollout from there.
+    Returns (reward, score, moves done) at the end of the rollout.
+    """
+    moveset = _worker_moveset
+    gs = GameState()
+    for move in path:
+        executed = moveset.do_move(gs, move)
+        assert executed, path
+    moves_done = list(path)
+    while not gs.is_complete():
+        legal_moves = moveset.list_legal_moves(gs)
+        if not legal_moves:
+            break
+        if _worker_rollout_policy == "heuristic" and random.random() > 0.2:
+            # prefer moves that increase the inventory-value the most
+            best_delta = max(moveset.delta_balance(move) for move in legal_moves)
+            legal_moves = [move for move in legal_moves if moveset.delta_balance(move) == best_delta]
+        move = random.choice(legal_moves)
+        moveset.do_move(gs, move)
+        moves_done.append(move)
+    return get_reward(gs), gs.get_progress_score(), moves_done
+
+
+#########################
+
+class MCTS:
+
+    def __init__(self, moveset: MoveSet, exploration: float):
+        self.moveset = moveset
+        self.exploration = exploration
+        self.gs = GameState()
+        self.root = Node(moveset.list_legal_moves(self.gs))
+        self.best_score = self.gs.get_progress_score()
+        self.best_moves = []  # type: Sequence[int]
+        self.num_rollouts = 0
+
+    def select_and_expand(self) -> Tuple[List[Node], List[int]]:
+        """Returns the path to a new leaf (nodes and moves), applying virtual loss along it."""
+        gs = self.gs
+        node = self.root
+        nodes = [node]
+        path = []
+        while not node.untried_moves and node.children:
+            move, node = node.select_child(self.exploration)
+            self.moveset.do_move(gs, move)
+            nodes.append(node)
+            path.append(move)
+        if node.untried_moves:
+            move = node.untried_moves.pop(random.randrange(len(node.untried_moves)))
+            executed = self.moveset.do_move(gs, move)
+            assert executed
+            child = Node(self.moveset.list_legal_moves(gs))
+            node.children[move] = child
+            nodes.append(child)
+            path.append(move)
+        for _ in path:
+            self.moveset.undo_move(gs)
+        for node in nodes:  # virtual loss
+            node.visits += 1
+        return nodes, path
+
+    def backpropagate(self, nodes: Sequence[Node], reward: float) -> None:
+        # note: visits were already incremented (virtual loss)
+        for node in nodes:
+            node.total_reward += reward
+
+    def record_result(self, score: Tuple[int, int], moves_done: Sequence[int]) -> None:
+        self.num_rollouts += 1
+        if score > self.best_score:
+            self.best_score = score
+            self.best_moves = moves_done
+
+    def get_best_gamestate(self) -> GameState:
+        gs = GameState()
+        for move in self.best_moves:
+            self.moveset.do_move(gs, move)
+        return gs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Monte Carlo tree search solver.")
+    parser.add_argument("--moves", choices=("chaincraft", "single"), default="chaincraft")
+    parser.add_argument("--rollout", choices=("random", "heuristic"), default="heuristic")
+    parser.add_argument("--exploration", type=float, default=1 / math.sqrt(2), help="UCT exploration constant")
+    parser.add_argument("--jobs", type=int, default=1, help="number of worker processes for rollouts")
+    parser.add_argument("--batch-size", type=int, default=0, help="leaves per batch (default: 4 x jobs)")
+    parser.add_argument("--time-budget", type=float, default=None, help="seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    hsprofile.add_profile_args(parser)
+    hsprogress.add_progress_args(parser)
+    args = parser.parse_args()
+    batch_size = args.batch_size or 4 * args.jobs
+
+    # main code starts.
+    print(f"=====")
+    print(f">>> main code starts... ({args.moves=}, {args.rollout=}, {args.jobs=}, {batch_size=})")
+    random.seed(args.seed)
+    time_start = time.monotonic()
+    profiler = hsprofile.Profiler(args)
+    profiler.start()
+    progress = hsprogress.create_progress_reporter(args)
+    moveset = MoveSet(args.moves)
+    mcts = MCTS(moveset, exploration=args.exploration)
+    pool = None
+    if args.jobs > 1:
+        pool = multiprocessing.Pool(args.jobs, initializer=_init_worker, initargs=(args.moves, args.rollout, args.seed))
+    else:
+        _init_worker(args.moves, args.rollout, args.seed)
+
+    iter_count = 0
+    while mcts.best_score[0] < len(BOTTOM_LINE_TRADES):
+        if args.time_budget is not None and time.monotonic() - time_start > args.time_budget:
+            print(f"time budget exhausted.")
+            break
+        iter_count += 1
+        batch = [mcts.select_and_expand() for _ in range(batch_size)]
+        if pool is not None:
+            results = pool.map(rollout, [path for nodes, path in batch])
+        else:
+            results = [rollout(path) for nodes, path in batch]
+        for (nodes, path), (reward, score, moves_done) in zip(batch, results):
+            mcts.backpropagate(nodes, reward)
+            mcts.record_result(score, moves_done)
+        if iter_count % 1000 == 0:
+            print(f"-----")
+            print(f"rollouts done: {mcts.num_rollouts}. root visits: {mcts.root.visits}. "
+                  f"best score (bottom trades done, inventory-value): {mcts.best_score}")
+            print(f"- history state: {mcts.get_best_gamestate().dump_history_trade_idx_ints()}")
+            print(f"Time taken: {time.monotonic() - time_start:.3f} seconds.")
+            progress.update(iterations=iter_count, rollouts=mcts.num_rollouts, root_visits=mcts.root.visits,
+                            best_score=mcts.best_score)
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+    profiler.stop()
+    progress.update(iterations=iter_count, rollouts=mcts.num_rollouts, root_visits=mcts.root.visits,
+                    best_score=mcts.best_score)
+    progress.close("solved" if mcts.best_score[0] == len(BOTTOM_LINE_TRADES) else "stopped")
+    gs = mcts.get_best_gamestate()
+    print(f"=====")
+    print(f"best state reached: {mcts.best_score=}. {mcts.num_rollouts=}")
+    gs.print_diagnostic_data()
+    if gs.is_complete():
+        print(f"DONE!")
+    print(f"Total time taken: {time.monotonic()-time_start:.3f} seconds.")
+    gs.print_readable_history()
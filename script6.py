@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+#
+# Solver for Hearthstone Barrens Mystery "Hunter Puzzle"
+# MIT License
+# Copyright (c) 2021 Laszlo Makk
+#
+# Evolutionary search over orderings of the bottom-line trades.
+# A solution of script3 is just an order of the bottom-line trades, each executed
+# via a full craft-sequence (GameState.chaincraft_bltrade).
+# - individual: a permutation of the indices of BOTTOM_LINE_TRADES
+# - fitness: how far the ordering gets before the first chaincraft fails:
+#   (bottom-line trades done, inventory-value at that point)
+# - genetic mode: tournament selection, order crossover (OX1), swap mutation, elitism;
+#   restarting from a random population when it converged
+# - local mode: hill climbing with swap mutations, restarting from random orderings when stuck
+# Fitness evaluations of a generation are batched across a process pool.
+# - A batch is sorted, so that consecutive orderings share long prefixes; each worker
+#   only undoes/replays the chaincrafts after the prefix shared with the previous ordering.
+# - The fitness only depends on the prefix up to (and including) the first failing trade,
+#   so results are also cached by those prefixes.
+
+import argparse
+import collections
+import multiprocessing
+import random
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import hsprofile
+import hsprogress
+from hsutil import BOTTOM_LINE_TRADES
+from hsutil import GameState
+from hsprogress import ProgressReporter
+
+NUM_BLTRADES = len(BOTTOM_LINE_TRADES)
+
+Ordering = Tuple[int, ...]
+Fitness = Tuple[int, int]
+
+
+#########################
+# fitness evaluation (this runs in the worker processes)
+
+_worker_gs = None  # type: Optional[GameState]
+_worker_applied = []  # type: List[int]  # bottom-line trade indices currently chaincrafted in _worker_gs
+
+
+def _init_worker() -> None:
+    global _worker_gs, _worker_applied
+    _worker_gs = GameState()
+    _worker_applied = []
+
+
+def evaluate_orderings(orderings: Sequence[Ordering]) -> List[Tuple[Fitness, int]]:
+    """Returns (fitness, number of chaincrafts that succeeded) for each ordering.
+    Orderings are best given sorted, to maximise shared prefixes.
+    """
+    if _worker_gs is None:
+        _init_worker()
+    gs = _worker_gs
+    applied = _worker_applied
+    results = []
+    for ordering in orderings:
+        shared = 0
+        while shared < len(applied) and applied[shared] == ordering[shared]:
+            shared += 1
+        while len(applied) > shared:
+            gs.undo_last_chaincraft()
+            applied.pop()
+        for bltrade_idx in ordering[shared:]:
+            if not gs.chaincraft_bltrade(BOTTOM_LINE_TRADES[bltrade_idx]):
+                break
+            applied.append(bltrade_idx)
+        results.append(((len(applied), gs.cur_inventory_goldvalue), len(applied)))
+    return results
+
+
+#########################
+
+class FitnessEvaluator:
+    """Evaluates orderings in batches, using a process pool, and caches results
+    keyed by the prefix of the ordering that determines the fitness.
+    At most cache_size prefixes are kept (least recently used are evicted), as long runs
+    would otherwise keep adding up to a population of them per generation.
+    """
+
+    def __init__(self, jobs: int, cache_size: int):
+        self.jobs = jobs
+        self.pool = multiprocessing.Pool(jobs, initializer=_init_worker) if jobs > 1 else None
+        self._prefix_cache = OrderedDict()  # type: collections.OrderedDict[Ordering, Fitness]
+        self.cache_size = cache_size
+        self.num_evaluations = 0
+        self.num_cache_hits = 0
+
+    def _lookup(self, ordering: Ordering) -> Optional[Fitness]:
+        for prefix_len in range(1, NUM_BLTRADES + 1):
+            prefix = ordering[:prefix_len]
+            fitness = self._prefix_cache.get(prefix)
+            if fitness is not None:
+                self._prefix_cache.move_to_end(prefix)
+                return fitness
+        return None
+
+    def evaluate(self, orderings: Sequence[Ordering]) -> List[Fitness]:
+        fitnesses = [self._lookup(ordering) for ordering in orderings]
+        todo = sorted(set(ordering for ordering, fitness in zip(orderings, fitnesses) if fitness is None))
+        self.num_evaluations += len(orderings)
+        self.num_cache_hits += len(orderings) - len(todo)
+        if todo:
+            if self.pool is not None:
+                chunk_size = -(-len(todo) // self.jobs)
+                chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+                results = [result for chunk_results in self.pool.map(evaluate_orderings, chunks)
+                           for result in chunk_results]
+            else:
+                results = evaluate_orderings(todo)
+            new_fitness = {}  # type: Dict[Ordering, Fitness]
+            for ordering, (fitness, num_done) in zip(todo, results):
+                # the trade at index num_done failed; anything after it does not matter
+                self._prefix_cache[ordering[:num_done + 1]] = fitness
+                new_fitness[ordering] = fitness
+            while len(self._prefix_cache) > self.cache_size:
+                self._prefix_cache.popitem(last=False)
+            fitnesses = [fitness if fitness is not None else new_fitness[ordering]
+                         for ordering, fitness in zip(orderings, fitnesses)]
+        return fitnesses
+
+    def __len__(self) -> int:
+        return len(self._prefix_cache)
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+
+
+#########################
+# genetic operators
+
+def order_crossover(parent1: Ordering, parent2: Ordering) -> Ordering:
+    """OX1: keep a random slice of parent1, fill the rest in the order of parent2."""
+    start, end = sorted(random.sample(range(NUM_BLTRADES + 1), 2))
+    child = [None] * NUM_BLTRADES  # type: List[Optional[int]]
+    child[start:end] = parent1[start:end]
+    kept = set(parent1[start:end])
+    fill = iter(gene for gene in parent2 if gene not in kept)
+    for idx in range(NUM_BLTRADES):
+        if child[idx] is None:
+            child[idx] = next(fill)
+    return tuple(child)
+
+
+def swap_mutation(ordering: Ordering, fitness: Fitness, num_swaps: int = 1) -> Ordering:
+    """Swaps two trades, at least one of which is not after the first failing trade
+    (swapping two trades after it would not change the fitness).
+    """
+    mutated = list(ordering)
+    num_done = fitness[0]
+    for _ in range(num_swaps):
+        i = random.randrange(min(num_done + 1, NUM_BLTRADES))
+        j = random.randrange(NUM_BLTRADES)
+        mutated[i], mutated[j] = mutated[j], mutated[i]
+    return tuple(mutated)
+
+
+def random_ordering() -> Ordering:
+    ordering = list(range(NUM_BLTRADES))
+    random.shuffle(ordering)
+    return tuple(ordering)
+
+
+def tournament_select(population: Sequence[Ordering], fitnesses: Sequence[Fitness], size: int) -> Tuple[Fitness, Ordering]:
+    contenders = random.sample(range(len(population)), size)
+    winner = max(contenders, key=lambda idx: fitnesses[idx])
+    return fitnesses[winner], population[winner]
+
+
+#########################
+
+def replay_ordering(ordering: Ordering) -> GameState:
+    """Chaincrafts the bottom-line trades of ordering, up to the first one that cannot be done."""
+    gs = GameState()
+    for bltrade_idx in ordering:
+        if not gs.chaincraft_bltrade(BOTTOM_LINE_TRADES[bltrade_idx]):
+            break
+    return gs
+
+
+def print_progress(generation: int, best: Tuple[Fitness, Ordering], evaluator: FitnessEvaluator,
+                   progress: ProgressReporter, time_start: float) -> None:
+    print(f"-----")
+    print(f"generation: {generation}. best fitness (bottom trades done, inventory-value): {best[0]}")
+    print(f"- best ordering: {list(best[1][:best[0][0] + 1])}...")
+    print(f"- history state: {replay_ordering(best[1]).dump_history_trade_idx_ints()}")
+    print(f"- evaluations: {evaluator.num_evaluations}. cache hits: {evaluator.num_cache_hits}. "
+          f"cache size: {len(evaluator)}")
+    print(f"Time taken: {time.monotonic() - time_start:.3f} seconds.")
+    progress.update(generation=generation, best_score=best[0], best_ordering=list(best[1]),
+                    cache_lookups=evaluator.num_evaluations, cache_hits=evaluator.num_cache_hits,
+                    cache_size=len(evaluator))
+
+
+def run_genetic(evaluator: FitnessEvaluator, args, progress: ProgressReporter, time_start: float) -> Tuple[Fitness, Ordering]:
+    population = [random_ordering() for _ in range(args.population)]
+    fitnesses = evaluator.evaluate(population)
+    best = max(zip(fitnesses, population))
+    population_best = best
+    generations_without_improvement = 0
+    generation = 0
+    while best[0][0] < NUM_BLTRADES and not is_out_of_time(args, time_start):
+        generation += 1
+        if generations_without_improvement > args.restart_after:
+            # the population converged; start over (best is kept)
+            population = [random_ordering() for _ in range(args.population)]
+            fitnesses = evaluator.evaluate(population)
+            population_best = max(zip(fitnesses, population))
+            generations_without_improvement = 0
+        ranked = sorted(zip(fitnesses, population), reverse=True)
+        children = []  # type: List[Ordering]
+        while len(children) < args.population - args.elite:
+            fitness1, parent1 = tournament_select(population, fitnesses, args.tournament)
+            if random.random() < args.crossover_rate:
+                fitness2, parent2 = tournament_select(population, fitnesses, args.tournament)
+                children.append(order_crossover(parent1, parent2))
+            else:
+                children.append(parent1)
+        # the mutation needs the fitness of the child itself (these are mostly cache hits)
+        children = [swap_mutation(child, child_fitness) if random.random() < args.mutation_rate else child
+                    for child, child_fitness in zip(children, evaluator.evaluate(children))]
+        population = [ordering for fitness, ordering in ranked[:args.elite]] + children
+        fitnesses = evaluator.evaluate(population)
+        generation_best = max(zip(fitnesses, population))
+        if generation_best[0] > population_best[0]:
+            population_best = generation_best
+            generations_without_improvement = 0
+        else:
+            generations_without_improvement += 1
+        best = max(best, generation_best)
+        if generation % 100 == 0:
+            print_progress(generation, best, evaluator, progress, time_start)
+    return best
+
+
+def run_local(evaluator: FitnessEvaluator, args, progress: ProgressReporter, time_start: float) -> Tuple[Fitness, Ordering]:
+    """Hill climbing, evaluating a batch of args.population neighbours per step."""
+    ordering = random_ordering()
+    current = (evaluator.evaluate([ordering])[0], ordering)
+    best = current
+    steps_without_improvement = 0
+    step = 0
+    while best[0][0] < NUM_BLTRADES and not is_out_of_time(args, time_start):
+        step += 1
+        neighbours = [swap_mutation(current[1], current[0], num_swaps=random.randint(1, 2))
+                      for _ in range(args.population)]
+        candidate = max(zip(evaluator.evaluate(neighbours), neighbours))
+        if candidate[0] >= current[0]:
+            steps_without_improvement = 0 if candidate[0] > current[0] else steps_without_improvement + 1
+            current = candidate
+        else:
+            steps_without_improvement += 1
+        if steps_without_improvement > args.restart_after:
+            ordering = random_ordering()
+            current = (evaluator.evaluate([ordering])[0], ordering)
+            steps_without_improvement = 0
+        best = max(best, current)
+        if step % 100 == 0:
+            print_progress(step, best, evaluator, progress, time_start)
+    return best
+
+
+def is_out_of_time(args, time_start: float) -> bool:
+    return args.time_budget is not None and time.monotonic() - time_start > args.time_budget
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evolutionary search over orderings of the bottom-line trades.")
+    parser.add_argument("--mode", choices=("genetic", "local"), default="genetic")
+    parser.add_argument("--population", type=int, default=200, help="population size (neighbours per step in local mode)")
+    parser.add_argument("--elite", type=int, default=4)
+    parser.add_argument("--tournament", type=int, default=3)
+    parser.add_argument("--crossover-rate", type=float, default=0.9)
+    parser.add_argument("--mutation-rate", type=float, default=0.3)
+    parser.add_argument("--restart-after", type=int, default=2000,
+                        help="restart after this many generations (local mode: steps) without improvement")
+    parser.add_argument("--jobs", type=int, default=1, help="number of worker processes for fitness evaluation")
+    parser.add_argument("--cache-size", type=int, default=500_000,
+                        help="max number of ordering prefixes whose fitness is cached")
+    parser.add_argument("--time-budget", type=float, default=None, help="seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    hsprofile.add_profile_args(parser)
+    hsprogress.add_progress_args(parser)
+    args = parser.parse_args()
+
+    # main code starts.
+    print(f"=====")
+    print(f">>> main code starts... ({args.mode=}, {args.population=}, {args.jobs=})")
+    random.seed(args.seed)
+    time_start = time.monotonic()
+    profiler = hsprofile.Profiler(args)
+    profiler.start()
+    progress = hsprogress.create_progress_reporter(args)
+    evaluator = FitnessEvaluator(args.jobs, args.cache_size)
+    if args.mode == "genetic":
+        best_fitness, best_ordering = run_genetic(evaluator, args, progress, time_start)
+    else:
+        best_fitness, best_ordering = run_local(evaluator, args, progress, time_start)
+    evaluator.close()
+    profiler.stop()
+    progress.update(best_score=best_fitness, best_ordering=list(best_ordering),
+                    cache_lookups=evaluator.num_evaluations, cache_hits=evaluator.num_cache_hits,
+                    cache_size=len(evaluator))
+    progress.close("solved" if best_fitness[0] == NUM_BLTRADES else "stopped")
+
+    gs = replay_ordering(best_ordering)
+    print(f"=====")
+    print(f"best ordering: {list(best_ordering)}. {best_fitness=}")
+    print(f"- evaluations: {evaluator.num_evaluations}. cache hits: {evaluator.num_cache_hits}. "
+          f"cache size: {len(evaluator)}")
+    gs.print_diagnostic_data()
+    if gs.is_complete():
+        print(f"DONE!")
+    print(f"Total time taken: {time.monotonic()-time_start:.3f} seconds.")
+    gs.print_readable_history()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+#
+# Solver for Hearthstone Barrens Mystery "Hunter Puzzle"
+# MIT License
+# Copyright (c) 2021 Laszlo Makk
+#
+# Bidirectional search.
+# The goal state is fully known (10xGOLD, all bottom-line trades done), so first we search
+# backwards from it (see hsreverse.py): all states from which the goal might be reachable
+# with at most k chaincrafts (the "perimeter"), as sets of state keys.
+# Then a DFS like script3.py runs forwards; once it is within k bottom-line trades of the goal,
+# it only continues from states that are in the perimeter (where the two searches meet).
+
+import argparse
+import time
+from typing import Optional
+
+import hsbounds
+import hsprofile
+import hsprogress
+import hsreverse
+import hsutil
+from hsutil import BOTTOM_LINE_TRADES
+from hsutil import GameState
+from hsutil import SearchBudget
+from hsprogress import ProgressReporter
+
+
+def search_forward(gs: GameState, perimeter: hsreverse.Perimeter, budget: SearchBudget, time_start: float,
+                   progress: Optional[ProgressReporter] = None) -> None:
+    trade_idx = 0  # next action to try
+    iter_count = 0
+    while not gs.is_complete():
+        if budget.visit(gs):
+            break
+        iter_count += 1
+        if iter_count % 100_000 == 0:
+            print(f"-----")
+            print(f"iters done: {iter_count//1000} k")
+            gs.print_diagnostic_data()
+            print(f"Time taken: {time.monotonic() - time_start:.3f} seconds.")
+        if progress is not None and iter_count % 10_000 == 0:
+            progress.update_from_search(gs, budget)
+
+        for trade in BOTTOM_LINE_TRADES[trade_idx:]:
+            if gs.chaincraft_bltrade(trade):
+                if not perimeter.may_reach_goal(gs):
+                    gs.undo_last_chaincraft()
+                    continue
+                trade_idx = 0
+                break
+        else:
+            trade_idx = gs.undo_last_chaincraft() + 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bidirectional solver: backward perimeter around the goal, "
+                                                 "then a forward DFS (as script3) meeting it.")
+    parser.add_argument("--depth", type=int, default=6,
+                        help="number of chaincrafts to search backwards from the goal (0: plain forward DFS)")
+    parser.add_argument("--max-states", type=int, default=5_000_000,
+                        help="max number of states in a level of the perimeter")
+    parser.add_argument("--compare", action="store_true",
+                        help="afterwards, also run the plain forward DFS (script3.py), and report the speedup")
+    hsutil.add_budget_args(parser)
+    hsbounds.add_bounds_args(parser)
+    hsprofile.add_profile_args(parser)
+    hsprogress.add_progress_args(parser)
+    args = parser.parse_args()
+
+    # main code starts.
+    print(f"=====")
+    print(f">>> main code starts... ({args.depth=})")
+    time_start = time.monotonic()
+    profiler = hsprofile.Profiler(args)
+    profiler.start()  # both directions
+    progress = hsprogress.create_progress_reporter(args)
+    perimeter = hsreverse.Perimeter(hsreverse.ReverseModel(), args.depth, max_states=args.max_states)
+    time_backward = time.monotonic() - time_start
+    print(f"perimeter built in {time_backward:.3f} seconds.")
+    perimeter.print_report()
+
+    gs = GameState()
+    bounds = hsbounds.attach_bounds(gs, args.bounds, atomic_chaincraft=True)
+    budget = hsutil.create_search_budget(args)
+    try:
+        search_forward(gs, perimeter, budget, time_start, progress)
+    except Exception as e:
+        if str(e) != "no solution":
+            raise
+    finally:
+        profiler.stop()
+        progress.finish_search(gs, budget)
+    time_total = time.monotonic() - time_start
+
+    if args.compare:
+        print(f"=====")
+        print(f">>> running the plain forward DFS (script3.py) for comparison...")
+        gs_plain = GameState()
+        hsbounds.attach_bounds(gs_plain, args.bounds, atomic_chaincraft=True)
+        budget_plain = hsutil.create_search_budget(args)
+        time_start_plain = time.monotonic()
+        try:
+            search_forward(gs_plain, hsreverse.Perimeter(hsreverse.ReverseModel(), 0), budget_plain, time_start_plain)
+        except Exception as e:
+            if str(e) != "no solution":
+                raise
+        time_plain = time.monotonic() - time_start_plain
+
+    print(f"=====")
+    hsbounds.print_bounds_report(bounds)
+    perimeter.print_report()
+    print(f"- backward: {time_backward:.3f} seconds. forward: {time_total - time_backward:.3f} seconds. "
+          f"nodes: {budget.num_nodes}")
+    if args.compare:
+        print(f"- plain forward DFS: {time_plain:.3f} seconds. nodes: {budget_plain.num_nodes}. "
+              f"solved: {gs_plain.is_complete()}")
+        print(f"- speedup: {time_plain / time_total:.2f}x (time), {budget_plain.num_nodes / budget.num_nodes:.2f}x (nodes)")
+    if not gs.is_complete():
+        budget.print_best_partial_state()
+        print(f"Total time taken: {time_total:.3f} seconds.")
+    else:
+        gs.print_diagnostic_data()
+        print(f"DONE!")
+        print(f"Total time taken: {time_total:.3f} seconds.")
+        gs.print_readable_history()
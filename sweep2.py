@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+#
+# Solver for Hearthstone Barrens Mystery "Hunter Puzzle"
+# MIT License
+# Copyright (c) 2021 Laszlo Makk
+#
+# Parameter sweep for the greedy solver (script2.py):
+# runs it for every (scoring heuristic, lookahead depth, trade ordering) combination, each with its own
+# search budget, in a process pool, and prints a table of the results.
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import time
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+import hsprogress
+import hsutil
+from hsutil import GameState
+from hsutil import SearchBudget
+from hsprogress import ProgressReporter
+import script2
+
+
+class SweepResult(NamedTuple):
+    scoring_heuristic: int
+    lookahead_depth: int
+    ordering: str  # see script2.TRADE_ORDERINGS
+    outcome: str  # "solved", "no solution", or "budget"
+    best_score: Tuple[int, int]  # (bottom trades done, inventory-value), see GameState.get_progress_score
+    num_nodes: int
+    wall_time: float
+
+
+def run_one(params: Tuple[int, int, str, Optional[float], Optional[int], Optional[str]]) -> SweepResult:
+    scoring_heuristic, lookahead_depth, ordering, time_budget, node_budget, progress_dir = params
+    gs = GameState()
+    budget = SearchBudget(time_budget=time_budget, node_budget=node_budget)
+    progress = ProgressReporter(socket_path=progress_dir, group=os.getppid(),
+                                run=f"heuristic={scoring_heuristic} depth={lookahead_depth} ordering={ordering}")
+    try:
+        script2.run_greedy(gs, scoring_heuristic=scoring_heuristic, lookahead_depth=lookahead_depth,
+                           budget=budget, trade_order=script2.get_trade_ordering(ordering),
+                           progress=progress, verbose=False)
+    except Exception as e:
+        if str(e) != "no solution":
+            raise
+        outcome = "no solution"
+    else:
+        outcome = "solved" if gs.is_complete() else "budget"
+    finally:
+        progress.finish_search(gs, budget)
+    best_score = gs.get_progress_score() if gs.is_complete() else budget.best_score
+    return SweepResult(scoring_heuristic, lookahead_depth, ordering, outcome, best_score, budget.num_nodes,
+                       time.monotonic() - budget.time_start)
+
+
+def print_results_table(results: Sequence[SweepResult]) -> None:
+    print(f"{'heuristic':>9} {'depth':>5} {'ordering':>14} {'outcome':>11} {'bl trades':>9} {'invvalue':>8} "
+          f"{'nodes':>10} {'time':>9} {'nodes/s':>8}")
+    for result in results:
+        nodes_per_sec = result.num_nodes / max(result.wall_time, 1e-9)
+        print(f"{result.scoring_heuristic:>9} {result.lookahead_depth:>5} {result.ordering:>14} {result.outcome:>11} "
+              f"{result.best_score[0]:>9} {result.best_score[1]:>8} {result.num_nodes:>10} {result.wall_time:>8.1f}s "
+              f"{nodes_per_sec:>8.0f}")
+
+
+def parse_int_list(s: str) -> Sequence[int]:
+    return [int(x) for x in s.split(",")]
+
+
+def parse_ordering_list(s: str) -> Sequence[str]:
+    orderings = s.split(",")
+    for ordering in orderings:
+        try:
+            script2.get_trade_ordering(ordering)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+    return orderings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run script2 (greedy) over a grid of heuristics, depths and orderings.")
+    parser.add_argument("--heuristics", type=parse_int_list, default=sorted(script2.SCORING_HEURISTICS),
+                        help="comma separated list of scoring heuristics")
+    parser.add_argument("--depths", type=parse_int_list, default=[5, 10, 15],
+                        help="comma separated list of lookahead depths")
+    parser.add_argument("--orderings", type=parse_ordering_list, default=["default"],
+                        help=f"comma separated list of trade orderings of the lookahead: "
+                             f"{', '.join(script2.TRADE_ORDERINGS)} or random:SEED")
+    parser.add_argument("--jobs", type=int, default=1, help="number of runs executing concurrently")
+    hsutil.add_budget_args(parser)
+    hsprogress.add_progress_args(parser)
+    args = parser.parse_args()
+    if args.time_budget is None and args.node_budget is None:
+        parser.error("a per-run --time-budget and/or --node-budget is required")
+    if args.progress_socket is not None and not os.path.isdir(args.progress_socket):
+        parser.error("--progress-socket must be a directory (each run gets its own socket in it)")
+
+    grid = [(heuristic, depth, ordering, args.time_budget, args.node_budget, args.progress_socket)
+            for heuristic, depth, ordering in itertools.product(args.heuristics, args.depths, args.orderings)]
+    print(f"=====")
+    print(f">>> sweep starts... ({len(grid)} runs, {args.jobs=})")
+    time_start = time.monotonic()
+    progress = hsprogress.create_progress_reporter(args, runs_total=len(grid), runs_done=0)
+    results = []
+    with multiprocessing.Pool(args.jobs) as pool:
+        for result in pool.imap_unordered(run_one, grid):
+            print(f"heuristic={result.scoring_heuristic}. depth={result.lookahead_depth}. "
+                  f"ordering={result.ordering}. {result.outcome}. best score: {result.best_score}. time taken: {result.wall_time:.3f} seconds.")
+            results.append(result)
+            progress.update(runs_done=len(results),
+                            best_score=max(result.best_score for result in results),
+                            num_solved=sum(result.outcome == "solved" for result in results))
+    progress.close("done")
+    results.sort(key=lambda result: (result.outcome == "solved", result.best_score), reverse=True)
+    print(f"=====")
+    print_results_table(results)
+    print(f"Total time taken: {time.monotonic()-time_start:.3f} seconds.")
@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+#
+# Solver for Hearthstone Barrens Mystery "Hunter Puzzle"
+# MIT License
+# Copyright (c) 2021 Laszlo Makk
+#
+# Verifier and replayer for trade-sequences (candidate solutions).
+# The rules are re-implemented here in a minimal way, independently from hsutil.GameState
+# (only the trade definitions are taken from hsutil), so that this can be used as an oracle
+# to test the (optimised) solver engines against.
+#
+# Input formats (see --format):
+# - ints:  one sequence per line; trade indices as printed by GameState.dump_history_trade_idx_ints
+#          e.g. "[38, 20, 53, 44, ...]"
+# - pairs: one sequence per line; (trade, multiplier) pairs, as in repr(GameState.history)
+#          e.g. "[(<TradeTop21(get 1xIRON_DAGGER for 1xGOLD)>, 10), (TradeBottom5ID, 1), ...]"
+# - steps: the whole file is a single sequence; one trade per line, optionally followed by its multiplier.
+#          '#' starts a comment. Also accepts the output of GameState.print_readable_history.
+#          e.g. docs/fiufa_solution_transcribed.txt
+#
+# Sequences are streamed, in chunks of lines that are parsed and replayed by the workers (--jobs).
+# Consecutive sequences sharing a prefix (as e.g. candidates written by a search do) only have
+# their new suffix replayed.
+
+import argparse
+import itertools
+import multiprocessing
+import re
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Type
+
+import hsutil
+from hsutil import ALL_TRADES_ANY, BOTTOM_LINE_TRADES, TOP_LINE_TRADES_ANY
+from hsutil import GameState
+from hsutil import Item
+from hsutil import Trade
+
+MAX_ITEM_TYPES_IN_INVENTORY = 10
+NUM_ITEMS = len(Item) + 1  # Item values start at 1; index 0 is unused
+_ITEMS = [None] + [Item(value) for value in range(1, NUM_ITEMS)]  # type: List[Optional[Item]]
+
+# each step is (trade name, claimed multiplier or None)
+Step = Tuple[str, Optional[int]]
+
+
+class Verdict(NamedTuple):
+    is_valid: bool  # all steps could be executed
+    is_complete: bool  # ... and all bottom-line trades were executed
+    is_pure_gold: bool  # ... and the final inventory is exactly STARTING_GOLD x GOLD
+    num_steps_ok: int
+    num_bltrades_done: int
+    final_inventory: Dict[Item, int]  # after the valid prefix of steps
+    error: Optional[str]
+
+    def describe(self) -> str:
+        if not self.is_valid:
+            return f"INVALID at step {self.num_steps_ok}: {self.error}"
+        if not self.is_complete:
+            return f"INCOMPLETE: {self.num_bltrades_done}/{len(BOTTOM_LINE_TRADES)} bottom-line trades done"
+        if not self.is_pure_gold:
+            return f"SOLVED (final inventory is not {hsutil.STARTING_GOLD}xGOLD)"
+        return f"SOLVED"
+
+
+class RulesEngine:
+    """Minimal rules engine for replaying trade-sequences.
+    The inventory is a list of counts indexed by item value.
+    Trades are numbered as in ALL_TRADES_ANY (i.e. as in "history state" lines), followed by
+    the other (unaffordable bad) top-line trades, so that trade indices can be replayed as they are.
+    """
+
+    def __init__(self):
+        all_trades = tuple(ALL_TRADES_ANY) + tuple(trade for trade in TOP_LINE_TRADES_ANY if trade not in ALL_TRADES_ANY)
+        self.trade_by_name = {trade.__name__: idx for idx, trade in enumerate(all_trades)}  # type: Dict[str, int]
+        self._names = [trade.__name__ for trade in all_trades]
+        self._we_get_item = [int(trade.WE_GET_ITEM) for trade in all_trades]
+        self._we_get_count = [trade.WE_GET_COUNT for trade in all_trades]
+        self._they_get_item = [int(trade.THEY_GET_ITEM) for trade in all_trades]
+        self._they_get_count = [trade.THEY_GET_COUNT for trade in all_trades]
+        # bit in the bottom-line trades bitmap for bottom-line trades; 0 for top-line trades
+        self._bl_bit = [(1 << BOTTOM_LINE_TRADES.index(trade)) if trade.IS_BOTTOM_LINE else 0
+                        for trade in all_trades]
+        # trade indices and (actual) multipliers of the valid prefix of the last replayed sequence,
+        # and snapshots of the state after each of its steps
+        self._prev_trade_idxs = []  # type: List[int]
+        self._prev_multipliers = []  # type: List[int]
+        self._prev_states = [self._initial_state()]  # type: List[Tuple[List[int], int, int]]
+        self.num_steps_replayed = 0
+
+    @staticmethod
+    def _initial_state() -> Tuple[List[int], int, int]:
+        """Returns (inventory, number of item types in inventory, bottom-line trades bitmap)."""
+        inventory = [0] * NUM_ITEMS
+        inventory[Item.GOLD] = hsutil.STARTING_GOLD
+        return inventory, 1, 0
+
+    def replay(self, steps: Sequence[Step]) -> Verdict:
+        trade_idxs = []  # type: List[int]
+        claimed_multipliers = []  # type: List[Optional[int]]
+        for name, claimed_multiplier in steps:
+            idx = self.trade_by_name.get(name)
+            if idx is None:
+                return self.replay_trade_idxs(trade_idxs, claimed_multipliers, unknown_trade=name)
+            trade_idxs.append(idx)
+            claimed_multipliers.append(claimed_multiplier)
+        return self.replay_trade_idxs(trade_idxs, claimed_multipliers)
+
+    def replay_trade_idxs(self, trade_idxs: Sequence[int], claimed_multipliers: Optional[Sequence[Optional[int]]] = None,
+                          *, unknown_trade: Optional[str] = None) -> Verdict:
+        """Replays the trades with the given indices (see the class docstring),
+        checking the claimed multipliers, if any, and then fails at unknown_trade, if given.
+        """
+        # find common prefix with the previous sequence, and continue from the state after it
+        prefix_len = 0
+        if claimed_multipliers is None:
+            for prev_idx, idx in zip(self._prev_trade_idxs, trade_idxs):
+                if prev_idx != idx:
+                    break
+                prefix_len += 1
+        else:
+            for prev_idx, prev_multiplier, idx, claimed_multiplier in zip(
+                    self._prev_trade_idxs, self._prev_multipliers, trade_idxs, claimed_multipliers):
+                if prev_idx != idx or (claimed_multiplier is not None and claimed_multiplier != prev_multiplier):
+                    break
+                prefix_len += 1
+        del self._prev_trade_idxs[prefix_len:]
+        del self._prev_multipliers[prefix_len:]
+        del self._prev_states[prefix_len + 1:]
+        inventory, num_itemtypes, bltrades_done = self._prev_states[-1]
+        inventory = list(inventory)
+
+        error = None
+        for step_idx in range(prefix_len, len(trade_idxs)):
+            idx = trade_idxs[step_idx]
+            claimed_multiplier = claimed_multipliers[step_idx] if claimed_multipliers is not None else None
+            error, num_itemtypes, bltrades_done, multiplier = self._do_step(
+                inventory, num_itemtypes, bltrades_done, idx, claimed_multiplier)
+            if error is not None:
+                break
+            self.num_steps_replayed += 1
+            self._prev_trade_idxs.append(idx)
+            self._prev_multipliers.append(multiplier)
+            self._prev_states.append((list(inventory), num_itemtypes, bltrades_done))
+        if error is None and unknown_trade is not None:
+            error = f"unknown trade {unknown_trade!r}"
+
+        num_steps_ok = len(self._prev_trade_idxs) if error else len(trade_idxs)
+        inventory, num_itemtypes, bltrades_done = self._prev_states[num_steps_ok]
+        final_inventory = {_ITEMS[item]: count for item, count in enumerate(inventory) if count > 0}
+        is_complete = error is None and bltrades_done == hsutil.BOTTOM_LINE_TRADES_DONE_BITMAP
+        is_pure_gold = is_complete and num_itemtypes == 1 and inventory[Item.GOLD] == hsutil.STARTING_GOLD
+        return Verdict(is_valid=error is None,
+                       is_complete=is_complete,
+                       is_pure_gold=is_pure_gold,
+                       num_steps_ok=num_steps_ok,
+                       num_bltrades_done=bin(bltrades_done).count("1"),
+                       final_inventory=final_inventory,
+                       error=error)
+
+    def _do_step(self, inventory: List[int], num_itemtypes: int, bltrades_done: int,
+                 idx: int, claimed_multiplier: Optional[int]) -> Tuple[Optional[str], int, int, int]:
+        """Executes the trade with index idx in-place on inventory.
+        Returns (error or None, new num_itemtypes, new bltrades_done, multiplier).
+        """
+        they_get_item = self._they_get_item[idx]
+        they_get_count = self._they_get_count[idx]
+        bl_bit = self._bl_bit[idx]
+        if bl_bit:
+            if bltrades_done & bl_bit:
+                return f"{self._names[idx]} was already executed", num_itemtypes, bltrades_done, 0
+            multiplier = 1 if inventory[they_get_item] >= they_get_count else 0
+        else:  # max-buy
+            multiplier = inventory[they_get_item] // they_get_count
+        if multiplier == 0:
+            return (f"{self._names[idx]}: not enough {_ITEMS[they_get_item].name} ({inventory[they_get_item]})",
+                    num_itemtypes, bltrades_done, 0)
+        if claimed_multiplier is not None and claimed_multiplier != multiplier:
+            return (f"{self._names[idx]}: multiplier should be {multiplier}, not {claimed_multiplier}",
+                    num_itemtypes, bltrades_done, 0)
+        we_get_item = self._we_get_item[idx]
+        if inventory[we_get_item] == 0:
+            num_itemtypes += 1
+        inventory[they_get_item] -= multiplier * they_get_count
+        inventory[we_get_item] += multiplier * self._we_get_count[idx]
+        if inventory[they_get_item] == 0:
+            num_itemtypes -= 1
+        if num_itemtypes > MAX_ITEM_TYPES_IN_INVENTORY:
+            return (f"{self._names[idx]}: more than {MAX_ITEM_TYPES_IN_INVENTORY} item types in inventory",
+                    num_itemtypes, bltrades_done, 0)
+        return None, num_itemtypes, bltrades_done | bl_bit, multiplier
+
+
+#########################
+# parsing
+
+_RE_INT = re.compile(r"\d+")
+_RE_PAIR = re.compile(r"(Trade(?:Top|Bottom)\w+)(?:\([^)]*\))?>?\s*,\s*(\d+)")
+_RE_STEP = re.compile(r"(Trade(?:Top|Bottom)\w+)(?:\([^)]*\))?>?(?:\s*,?\s*(\d+))?")
+
+
+def parse_ints_line_to_trade_idxs(line: str) -> Tuple[List[int], Optional[str]]:
+    """Returns (trade indices, None), or (the trade indices before the first unknown one, its name).
+    The indices can be replayed as they are by RulesEngine.replay_trade_idxs.
+    """
+    # allow lines as printed by GameState.print_diagnostic_data
+    if "[" in line:
+        line = line[line.index("["):]
+    try:
+        trade_idxs = list(map(int, line.strip().strip("[]").split(","))) if line.strip("[] \n") else []
+    except ValueError:  # other separators than ", "
+        trade_idxs = [int(x) for x in _RE_INT.findall(line)]
+    if trade_idxs and not (0 <= min(trade_idxs) and max(trade_idxs) < len(ALL_TRADES_ANY)):
+        for pos, idx in enumerate(trade_idxs):
+            if not 0 <= idx < len(ALL_TRADES_ANY):
+                return trade_idxs[:pos], f"#{idx}"
+    return trade_idxs, None
+
+
+def parse_ints_line(line: str) -> Sequence[Step]:
+    trade_idxs, unknown_trade = parse_ints_line_to_trade_idxs(line)
+    steps = [(ALL_TRADES_ANY[idx].__name__, None) for idx in trade_idxs]  # type: List[Step]
+    if unknown_trade is not None:
+        steps.append((unknown_trade, None))
+    return steps
+
+
+def parse_pairs_line(line: str) -> Sequence[Step]:
+    return [(name, int(mult)) for name, mult in _RE_PAIR.findall(line)]
+
+
+def parse_steps_lines(lines: Iterable[str]) -> Sequence[Step]:
+    steps = []
+    for line in lines:
+        line = line.split("#", 1)[0]
+        match = _RE_STEP.search(line)
+        if match is None:
+            continue
+        name, mult = match.groups()
+        steps.append((name, int(mult) if mult is not None else None))
+    return steps
+
+
+def iter_sequences(lines: Iterable[str], fmt: str) -> Iterator[Sequence[Step]]:
+    if fmt == "steps":
+        yield parse_steps_lines(lines)
+        return
+    parse_line = parse_ints_line if fmt == "ints" else parse_pairs_line
+    for line in lines:
+        if line.strip():
+            yield parse_line(line)
+
+
+#########################
+# cross-checking hsutil.GameState against the rules engine
+
+def cross_check_gamestate(steps: Sequence[Step], verdict: Verdict) -> Optional[Tuple[bool, str]]:
+    """Replays steps using hsutil.GameState (with observations 4 and 5 lifted, so that
+    it accepts as much as possible), and compares it with verdict.
+    Returns (is_mismatch, description of the difference), if there is any difference.
+    GameState rejecting a valid step is not a mismatch, as it prunes states that cannot
+    lead to a solution (e.g. sanity_check_current_state).
+    """
+    gs = GameState(allow_bad_trades=True, allow_leftover_items=True)
+    for step_idx, (name, claimed_multiplier) in enumerate(steps[:verdict.num_steps_ok]):
+        trade = _TRADE_BY_NAME.get(name)
+        if trade is None:
+            return False, f"step {step_idx}: {name} is not in ALL_TRADES_ANY"
+        if not gs.do_trade(trade):
+            return False, f"step {step_idx}: GameState pruned {name}"
+    if verdict.num_steps_ok < len(steps):
+        name, claimed_multiplier = steps[verdict.num_steps_ok]
+        trade = _TRADE_BY_NAME.get(name)
+        if trade is not None and gs.do_trade(trade):
+            # note: GameState calculates the multiplier itself; only a wrong claimed multiplier is fine here
+            if claimed_multiplier is None or claimed_multiplier == gs.history[-1][1]:
+                return True, f"step {verdict.num_steps_ok}: GameState accepted invalid {name}"
+    if gs.is_complete() != verdict.is_complete:
+        return True, f"GameState.is_complete()={gs.is_complete()} differs"
+    if verdict.is_valid and gs.get_nonzero_inventory() != verdict.final_inventory:
+        return True, f"final inventory differs: {gs.get_nonzero_inventory()}"
+    return None
+
+_TRADE_BY_NAME = {trade.__name__: trade for trade in ALL_TRADES_ANY}  # type: Dict[str, Type[Trade]]
+
+
+#########################
+
+def _verify_chunk(args: Tuple[Sequence[str], str, bool]) -> Tuple[List[Tuple[Verdict, Optional[Tuple[bool, str]]]], int]:
+    """Parses and verifies a chunk of input lines (in the worker, so that parsing is parallel too)."""
+    lines, fmt, cross_check = args
+    engine = _get_worker_engine()
+    results = []
+    if fmt == "ints" and not cross_check:
+        # fast path: trade indices are replayed without converting them to names
+        for line in lines:
+            if line.strip():
+                trade_idxs, unknown_trade = parse_ints_line_to_trade_idxs(line)
+                results.append((engine.replay_trade_idxs(trade_idxs, unknown_trade=unknown_trade), None))
+        return results, engine.num_steps_replayed
+    for steps in iter_sequences(lines, fmt):
+        verdict = engine.replay(steps)
+        difference = cross_check_gamestate(steps, verdict) if cross_check else None
+        results.append((verdict, difference))
+    return results, engine.num_steps_replayed
+
+
+_worker_engine = None  # type: Optional[RulesEngine]
+
+def _get_worker_engine() -> RulesEngine:
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = RulesEngine()
+    _worker_engine.num_steps_replayed = 0
+    return _worker_engine
+
+
+def _iter_chunks(lines: Iterator[str], chunk_size: int) -> Iterator[List[str]]:
+    while True:
+        chunk = list(itertools.islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Verify/replay trade-sequences against the rules of the puzzle.")
+    parser.add_argument("files", nargs="*", default=["-"], help="input files ('-' for stdin)")
+    parser.add_argument("--format", choices=("ints", "pairs", "steps"), default="ints")
+    parser.add_argument("--jobs", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="input lines per job sent to a worker")
+    parser.add_argument("--quiet", action="store_true", help="only print non-solutions and the summary")
+    parser.add_argument("--require-pure-gold", action="store_true",
+                        help=f"only count solutions ending with exactly {hsutil.STARTING_GOLD}xGOLD")
+    parser.add_argument("--cross-check", action="store_true",
+                        help="also replay each sequence using hsutil.GameState and report differences")
+    parser.add_argument("--replay", action="store_true", help="print the state after each step (single sequence)")
+    args = parser.parse_args()
+
+    print(f"=====")
+    time_start = time.monotonic()
+    num_sequences = 0
+    num_solved = 0
+    num_mismatches = 0
+    num_pruned = 0
+    num_steps_replayed = 0
+    for filename in args.files:
+        infile = sys.stdin if filename == "-" else open(filename, "r")
+        with infile:
+            if args.replay:
+                steps = next(iter_sequences(infile, args.format))
+                engine = RulesEngine()
+                for step_idx in range(len(steps)):
+                    verdict = engine.replay(steps[:step_idx + 1])
+                    inventory = verdict.final_inventory
+                    print(f"step={step_idx}. {steps[step_idx][0]}. inventory({len(inventory)})={inventory}")
+                    if not verdict.is_valid:
+                        break
+                print(f"{filename}: {verdict.describe()}")
+                num_sequences += 1
+                num_solved += verdict.is_complete and (verdict.is_pure_gold or not args.require_pure_gold)
+                num_steps_replayed += engine.num_steps_replayed
+                continue
+            if args.format == "steps":  # a single sequence
+                chunks = iter([(list(infile), args.format, args.cross_check)])
+            else:
+                chunks = ((chunk, args.format, args.cross_check) for chunk in _iter_chunks(infile, args.chunk_size))
+            if args.jobs > 1:
+                pool = multiprocessing.Pool(args.jobs)
+                results_iter = pool.imap(_verify_chunk, chunks)
+            else:
+                results_iter = map(_verify_chunk, chunks)
+            for results, steps_replayed in results_iter:
+                num_steps_replayed += steps_replayed
+                for verdict, difference in results:
+                    is_solved = verdict.is_complete and (verdict.is_pure_gold or not args.require_pure_gold)
+                    num_sequences += 1
+                    num_solved += is_solved
+                    if not (args.quiet and is_solved):
+                        print(f"{filename}#{num_sequences}: {verdict.describe()}")
+                    if difference is None:
+                        continue
+                    is_mismatch, description = difference
+                    if is_mismatch:
+                        num_mismatches += 1
+                        print(f"{filename}#{num_sequences}: MISMATCH with GameState: {description}")
+                    else:
+                        num_pruned += 1
+                        if not args.quiet:
+                            print(f"{filename}#{num_sequences}: {description}")
+            if args.jobs > 1:
+                pool.close()
+                pool.join()
+
+    time_taken = time.monotonic() - time_start
+    print(f"=====")
+    print(f"sequences: {num_sequences}. solutions: {num_solved}. steps replayed: {num_steps_replayed}.")
+    if args.cross_check:
+        print(f"mismatches with GameState: {num_mismatches}. pruned by GameState: {num_pruned}")
+    print(f"Total time taken: {time_taken:.3f} seconds. "
+          f"({num_sequences / max(time_taken, 1e-9) * 60:,.0f} sequences/minute)")